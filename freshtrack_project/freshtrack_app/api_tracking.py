@@ -1,22 +1,39 @@
 """
 API endpoints for tracking features
 Provides JSON data for AJAX requests and dynamic updates
+The GET endpoints are async: plain lookups use the async ORM, and the sync tracking helpers
+(cached widgets, risk lists, pagination) run in a worker thread via sync_to_async
 """
 
+from asgiref.sync import sync_to_async
 from django.http import JsonResponse
-from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_http_methods
+from .async_views import login_required, require_http_methods
 from .models import Product, Alert
-from .tracking_features import HourBasedTracking, SmartAlerts, SaveMoney, ReduceWaste
+from .tracking_features import HourBasedTracking, SmartAlerts, SaveMoney, ReduceWaste, CatalogWidgets
+from .pagination import keyset_paginate
+from .db_router import read_replica
+from .instrumentation import query_budget
 import json
 
 
+def _is_admin(user):
+    """Staff, superusers and users with the admin role"""
+    if user.is_staff or user.is_superuser:
+        return True
+    try:
+        return user.role.role == 'admin'
+    except Exception:
+        return False
+
+
 @login_required
 @require_http_methods(["GET"])
-def api_product_hours(request, product_id):
+@read_replica
+@query_budget(6)
+async def api_product_hours(request, product_id):
     """Get real-time hours remaining for a product"""
     try:
-        product = Product.objects.get(id=product_id)
+        product = await Product.objects.select_related('seller__user').aget(id=product_id)
         
         # Check visibility
         if not product.is_visible_to_buyers() and request.user.username != product.seller.user.username:
@@ -37,10 +54,12 @@ def api_product_hours(request, product_id):
 
 @login_required
 @require_http_methods(["GET"])
-def api_money_saving_deals(request):
+@read_replica
+@query_budget(6)
+async def api_money_saving_deals(request):
     """Get top money-saving deals"""
     try:
-        deals = SaveMoney.get_money_saving_deals(Product.objects.approved_available())[:10]
+        deals = await sync_to_async(CatalogWidgets.money_saving_deals)(limit=10)
         
         response_data = []
         for deal in deals:
@@ -64,10 +83,12 @@ def api_money_saving_deals(request):
 
 @login_required
 @require_http_methods(["GET"])
-def api_waste_risk_products(request):
+@read_replica
+@query_budget(6)
+async def api_waste_risk_products(request):
     """Get products at waste risk"""
     try:
-        risk_products = ReduceWaste.get_products_at_waste_risk(hours_threshold=24)[:10]
+        risk_products = (await sync_to_async(ReduceWaste.get_products_at_waste_risk)(hours_threshold=24))[:10]
         
         response_data = []
         for product_risk in risk_products:
@@ -91,10 +112,12 @@ def api_waste_risk_products(request):
 
 @login_required
 @require_http_methods(["GET"])
-def api_waste_stats(request):
+@read_replica
+@query_budget(6)
+async def api_waste_stats(request):
     """Get waste prevention statistics"""
     try:
-        stats = ReduceWaste.get_waste_prevention_stats()
+        stats = await sync_to_async(CatalogWidgets.waste_stats)()
         
         return JsonResponse({
             'total_discount_value': stats['total_discount_value'],
@@ -108,13 +131,15 @@ def api_waste_stats(request):
 
 @login_required
 @require_http_methods(["GET"])
-def api_seller_alerts(request):
+@read_replica
+@query_budget(6)
+async def api_seller_alerts(request):
     """Get seller alerts"""
     try:
-        alerts = SmartAlerts.get_seller_alerts(request.user, unread_only=True)
+        alerts = await sync_to_async(SmartAlerts.get_seller_alerts)(request.user, unread_only=True)
         
         response_data = []
-        for alert in alerts:
+        async for alert in alerts.select_related('product'):
             response_data.append({
                 'id': alert.id,
                 'product_name': alert.product.name,
@@ -193,19 +218,12 @@ def api_apply_recommended_discount(request, product_id):
 
 @login_required
 @require_http_methods(["GET"])
-def api_hot_deals(request):
+@read_replica
+@query_budget(6)
+async def api_hot_deals(request):
     """Get hot deals (products expiring within 6 hours)"""
     try:
-        from django.utils import timezone
-        from datetime import timedelta
-        from django.db.models import Q
-        
-        now = timezone.now()
-        hot_deals = Product.objects.filter(
-            status='approved',
-            expiry_datetime__lte=now + timedelta(hours=6),
-            expiry_datetime__gt=now
-        ).select_related('seller').order_by('expiry_datetime')[:20]
+        hot_deals = await sync_to_async(CatalogWidgets.hot_deals)(limit=20)
         
         response_data = []
         for product in hot_deals:
@@ -226,3 +244,73 @@ def api_hot_deals(request):
         })
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
+
+
+@login_required
+@require_http_methods(["GET"])
+@read_replica
+@query_budget(6)
+async def api_admin_products(request):
+    """Paginated admin product table (same filters and cursors as admin_products)"""
+    if not await sync_to_async(_is_admin)(request.user):
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    
+    products = Product.objects.admin_listing(
+        status=request.GET.get('status', ''),
+        seller=request.GET.get('seller', ''),
+        expiry=request.GET.get('expiry', ''),
+    )
+    page = await sync_to_async(keyset_paginate)(products, request.GET.get('cursor'), page_size=25)
+    
+    response_data = []
+    for product in page:
+        status = HourBasedTracking.get_hours_status(product)
+        response_data.append({
+            'id': product.id,
+            'name': product.name,
+            'seller': product.seller.company_name,
+            'seller_id': product.seller_id,
+            'price': float(product.price),
+            'discount': product.get_final_discount(),
+            'quantity': product.quantity,
+            'status': product.status,
+            'expiry_datetime': product.expiry_datetime.isoformat(),
+            'hours': HourBasedTracking.get_hours_remaining(product),
+            'hours_status': status['status'],
+            'hours_label': status['label'],
+        })
+    
+    return JsonResponse({
+        'products': response_data,
+        'count': len(response_data),
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
+
+
+@login_required
+@require_http_methods(["GET"])
+@read_replica
+@query_budget(6)
+async def api_expiry_timeline(request):
+    """Upcoming expiries of approved products per day (?bucket=day) or hour (?bucket=hour)"""
+    if not await sync_to_async(_is_admin)(request.user):
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    
+    bucket = 'hour' if request.GET.get('bucket') == 'hour' else 'day'
+    max_periods = 168 if bucket == 'hour' else 90
+    try:
+        periods = min(max(int(request.GET.get('periods', 48 if bucket == 'hour' else 7)), 1), max_periods)
+    except ValueError:
+        return JsonResponse({'error': 'periods must be an integer'}, status=400)
+    
+    buckets = await sync_to_async(ReduceWaste.get_expiry_buckets)(periods=periods, bucket=bucket)
+    
+    return JsonResponse({
+        'bucket': bucket,
+        'timeline': [
+            {'start': start.isoformat(), 'count': count}
+            for start, count in buckets
+        ],
+        'total': sum(count for _, count in buckets),
+    })
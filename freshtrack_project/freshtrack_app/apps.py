@@ -1,5 +1,26 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete
 
 class FreshtrackAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'freshtrack_project.freshtrack_app'
+
+    def ready(self):
+        from .db_tuning import configure_sqlite
+        from .instrumentation import install_query_counter
+        from .models import (
+            Product, Review, refresh_summary_on_product_delete, refresh_summary_on_review_delete,
+            remove_rating_on_review_delete,
+        )
+        connection_created.connect(configure_sqlite, dispatch_uid='freshtrack_configure_sqlite')
+        connection_created.connect(install_query_counter, dispatch_uid='freshtrack_install_query_counter')
+        post_delete.connect(
+            refresh_summary_on_product_delete, sender=Product, dispatch_uid='freshtrack_summary_product_delete'
+        )
+        post_delete.connect(
+            remove_rating_on_review_delete, sender=Review, dispatch_uid='freshtrack_rating_review_delete'
+        )
+        post_delete.connect(
+            refresh_summary_on_review_delete, sender=Review, dispatch_uid='freshtrack_summary_review_delete'
+        )
@@ -0,0 +1,81 @@
+"""
+Async-capable view helpers
+- Django 4.2's login_required, require_http_methods and csrf_exempt wrap a view in a plain
+  function, which turns an `async def` view back into a sync one (the ASGI handler then runs
+  it in a thread); the versions here keep coroutine views as coroutines
+- Sync views are handed to Django's own decorators, so these are drop-in replacements
+- aget_user() loads request.user in a worker thread (the session and user lookups are sync)
+- arender() renders in a worker thread, since templates may still follow relations lazily
+"""
+
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import decorators as auth_decorators
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponseNotAllowed
+from django.shortcuts import render
+from django.utils.log import log_response
+from django.views.decorators import csrf, http
+
+
+def _load_user(request):
+    # Touching the lazy user runs the session + user queries once; later reads are free
+    request.user.is_authenticated
+    return request.user
+
+
+async def aget_user(request):
+    """request.user, loaded without blocking the event loop"""
+    return await sync_to_async(_load_user)(request)
+
+
+async def arender(request, template_name, context=None, **kwargs):
+    """Async render(): same arguments, rendered in a worker thread"""
+    return await sync_to_async(render)(request, template_name, context, **kwargs)
+
+
+def login_required(view_func):
+    """login_required that also accepts async views"""
+    if not iscoroutinefunction(view_func):
+        return auth_decorators.login_required(view_func)
+
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if user.is_authenticated:
+            return await view_func(request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+    return wrapper
+
+
+def require_http_methods(request_method_list):
+    """require_http_methods that also accepts async views"""
+    def decorator(view_func):
+        if not iscoroutinefunction(view_func):
+            return http.require_http_methods(request_method_list)(view_func)
+
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in request_method_list:
+                response = HttpResponseNotAllowed(request_method_list)
+                log_response(
+                    'Method Not Allowed (%s): %s', request.method, request.path,
+                    response=response, request=request,
+                )
+                return response
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def csrf_exempt(view_func):
+    """csrf_exempt that also accepts async views"""
+    if not iscoroutinefunction(view_func):
+        return csrf.csrf_exempt(view_func)
+
+    @wraps(view_func)
+    async def wrapper(*args, **kwargs):
+        return await view_func(*args, **kwargs)
+    wrapper.csrf_exempt = True
+    return wrapper
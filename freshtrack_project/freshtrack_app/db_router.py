@@ -0,0 +1,69 @@
+"""
+Read-replica routing
+- Views (sync or async) decorated with @read_replica send their GET/HEAD reads to the replica alias
+- Everything else (payments, approvals, any write) stays on the primary ('default')
+- Sessions and auth always read from the primary so a fresh login is never missed
+- The replica alias is settings.DATABASE_REPLICA_ALIAS, only set when a replica is configured
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+_use_replica = ContextVar('freshtrack_use_replica', default=False)
+
+# Apps whose rows must be read right after they are written (login, sessions, the db cache)
+PRIMARY_ONLY_APPS = {'auth', 'sessions', 'contenttypes', 'admin', 'django_cache'}
+
+
+@contextmanager
+def replica_reads():
+    """Send ORM reads inside this block to the replica (if one is configured)"""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_replica(view_func):
+    """View decorator: GET/HEAD requests read from the replica, other methods use the primary"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view_func(request, *args, **kwargs)
+            # The flag is a ContextVar, so ORM calls sent to worker threads see it too
+            with replica_reads():
+                return await view_func(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_func(request, *args, **kwargs)
+        with replica_reads():
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Route reads to the replica inside replica_reads(), and all writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        replica = getattr(settings, 'DATABASE_REPLICA_ALIAS', None)
+        if replica and _use_replica.get() and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return replica
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary and replica hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
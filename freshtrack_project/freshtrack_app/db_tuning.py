@@ -0,0 +1,31 @@
+"""
+SQLite connection tuning
+- Connected to connection_created in FreshtrackAppConfig.ready()
+- WAL lets readers keep going while a writer commits, and busy_timeout makes a writer
+  wait for the lock instead of failing at once with "database is locked"
+- Pragma values come from settings.SQLITE_PRAGMAS (read from the environment)
+"""
+
+from django.conf import settings
+
+# Applied in this order; journal_mode first since it decides how the others behave
+PRAGMA_ORDER = ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size')
+
+
+def apply_sqlite_pragmas(cursor, pragmas):
+    """Run PRAGMA statements for every configured value on a DB-API cursor"""
+    for name in PRAGMA_ORDER:
+        value = pragmas.get(name)
+        if value is None or value == '':
+            continue
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """connection_created receiver: tune every new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if pragmas:
+        with connection.cursor() as cursor:
+            apply_sqlite_pragmas(cursor, pragmas)
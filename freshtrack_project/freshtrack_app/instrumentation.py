@@ -0,0 +1,202 @@
+"""
+Per-request performance instrumentation
+- PerformanceMiddleware counts SQL queries and DB time on every connection, and times the
+  view and template rendering
+- Connections are per thread, so count_query is installed on each connection when it is
+  opened (connection_created, hooked up in FreshtrackAppConfig.ready()) and adds to the
+  stats of whichever request is current in the ContextVar; sync_to_async copies the context
+  into its worker thread, so ORM calls made there by async views are counted too
+- Results go out as a Server-Timing header (visible in browser dev tools) and as one
+  JSON log line per request on the 'freshtrack.performance' logger
+- Views can declare a query budget with @query_budget(n); every overrun is logged as a
+  warning, and when settings.QUERY_BUDGET_STRICT is on (tests) the query that goes over
+  the budget raises QueryBudgetExceeded inside the view. Nothing is raised once the view
+  has returned its response, so session saves and the like never turn a finished
+  response (e.g. an applied payment) into an error
+"""
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+from functools import wraps
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('freshtrack.performance')
+
+# Stats of the current request (queries, db and template seconds), shared with the worker
+# threads the request's code runs in
+_request_stats = ContextVar('freshtrack_request_stats', default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    """A view ran more SQL queries than its declared budget"""
+
+
+@contextmanager
+def _enforce_budget():
+    """Make count_query refuse queries over the strict budget until the view returns"""
+    stats = _request_stats.get()
+    if stats is None or stats['strict_budget'] is None:
+        yield
+        return
+    stats['enforce'] = stats['strict_budget']
+    try:
+        yield
+    finally:
+        stats['enforce'] = None
+
+
+def query_budget(max_queries, strict=True):
+    """
+    View decorator: declare the most SQL queries one request to this view may run.
+    strict=False only ever logs overruns, for views that must not fail once they have
+    changed data (checkout, payment callbacks).
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        view_func.query_budget_strict = strict
+        if not strict:
+            return view_func
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def wrapper(*args, **kwargs):
+                with _enforce_budget():
+                    return await view_func(*args, **kwargs)
+        else:
+            @wraps(view_func)
+            def wrapper(*args, **kwargs):
+                with _enforce_budget():
+                    return view_func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_query(execute, sql, params, many, context):
+    """Execute wrapper: add the query and its DB time to the current request's stats"""
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    budget = stats['enforce']
+    if budget is not None and stats['queries'] >= budget:
+        # Refused before it runs; still counted so the request log shows the overrun
+        stats['queries'] += 1
+        raise QueryBudgetExceeded(f'query {stats["queries"]} is over the budget of {budget}: {sql[:200]}')
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats['queries'] += 1
+        stats['db'] += time.perf_counter() - started
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """connection_created receiver: count queries on every new connection"""
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class TimedTemplate(Template):
+    """Template that adds its render time to the current request's total"""
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats = _request_stats.get()
+            if stats is not None:
+                stats['template'] += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose templates report render time to PerformanceMiddleware"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class PerformanceMiddleware:
+    """Record queries, DB time, template time and view time for every request"""
+
+    # Runs natively under both WSGI and ASGI, so async views are not pushed into a thread
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self._measure(request) as measured:
+            response = self.get_response(request)
+        return self._finish(request, response, measured)
+
+    async def __acall__(self, request):
+        # The stats live in a ContextVar that sync_to_async copies into its worker threads,
+        # so ORM calls and renders that async views run there are counted as well
+        with self._measure(request) as measured:
+            response = await self.get_response(request)
+        return self._finish(request, response, measured)
+
+    @contextmanager
+    def _measure(self, request):
+        stats = {'queries': 0, 'db': 0.0, 'template': 0.0, 'strict_budget': None, 'enforce': None}
+        request._query_budget = None
+        request._view_name = None
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            _request_stats.reset(token)
+            stats['total'] = time.perf_counter() - started
+
+    def _finish(self, request, response, stats):
+        timing = {
+            'view': request._view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats['queries'],
+            'db_ms': round(stats['db'] * 1000, 2),
+            'template_ms': round(stats['template'] * 1000, 2),
+            'view_ms': round(stats['total'] * 1000, 2),
+            'query_budget': request._query_budget,
+        }
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timing["db_ms"]};desc="{stats["queries"]} queries"',
+            f'tpl;dur={timing["template_ms"]}',
+            f'view;dur={timing["view_ms"]}',
+        ])
+        response['X-Query-Count'] = str(stats['queries'])
+        logger.info(json.dumps(timing))
+
+        budget = request._query_budget
+        if budget is not None and stats['queries'] > budget:
+            message = (
+                f'{request._view_name} ran {stats["queries"]} queries, '
+                f'over its budget of {budget} ({request.method} {request.path})'
+            )
+            logger.warning(message)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_name = getattr(view_func, '__name__', repr(view_func))
+        request._query_budget = getattr(view_func, 'query_budget', None)
+        stats = _request_stats.get()
+        if (stats is not None and getattr(view_func, 'query_budget_strict', False)
+                and getattr(settings, 'QUERY_BUDGET_STRICT', False)):
+            stats['strict_budget'] = request._query_budget
+        return None
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from freshtrack_project.freshtrack_app.widget_cache import WidgetCache
+
+
+class Command(BaseCommand):
+    help = 'Show cache hit/miss counts per widget namespace'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after printing them',
+        )
+
+    def handle(self, *args, **options):
+        alias = getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')
+        backend = settings.CACHES[alias]['BACKEND'].rsplit('.', 1)[-1]
+        self.stdout.write(f'Cache alias: {alias} ({backend})')
+        if backend == 'LocMemCache':
+            self.stdout.write(self.style.WARNING(
+                'Local-memory cache is per process, counters from web workers are not visible here'
+            ))
+
+        self.stdout.write(f"{'namespace':<22}{'hit':>8}{'stale':>8}{'miss':>8}{'hit rate':>10}")
+        for name, counts in WidgetCache.stats().items():
+            total = sum(counts.values())
+            served = counts['hit'] + counts['stale']
+            rate = f'{served / total * 100:.1f}%' if total else '-'
+            self.stdout.write(
+                f"{name:<22}{counts['hit']:>8}{counts['stale']:>8}{counts['miss']:>8}{rate:>10}"
+            )
+
+        if options['reset']:
+            WidgetCache.reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from freshtrack_project.freshtrack_app.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Mark products past their expiry time as expired (once, or repeatedly with --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and sweep every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='Seconds between sweeps when running with --loop (default: 60)',
+        )
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self.sweep()
+            return
+
+        interval = max(1, options['interval'])
+        self.stdout.write(f'Sweeping expired products every {interval}s (Ctrl+C to stop)')
+        try:
+            while True:
+                self.sweep()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped expiry sweeper')
+
+    def sweep(self):
+        now = timezone.now()
+        expired = Product.objects.expire_due(now=now)
+        self.stdout.write(f'[{now:%Y-%m-%d %H:%M:%S}] Marked {expired} product(s) as expired')
+        return expired
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from freshtrack_project.freshtrack_app.tracking_features import AlertEngine
+
+
+class Command(BaseCommand):
+    help = 'Generate expiry alerts (48h/24h/6h/1h) for all approved products in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and generate alerts every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=300,
+            help='Seconds between runs when running with --loop (default: 300)',
+        )
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self.generate()
+            return
+
+        interval = max(1, options['interval'])
+        self.stdout.write(f'Generating alerts every {interval}s (Ctrl+C to stop)')
+        try:
+            while True:
+                self.generate()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped alert engine')
+
+    def generate(self):
+        now = timezone.now()
+        result = AlertEngine.run(now=now)
+        self.stdout.write(
+            f"[{now:%Y-%m-%d %H:%M:%S}] Scanned {result['products_scanned']} product(s), "
+            f"emitted {result['alerts_emitted']} alert(s)"
+        )
+        return result
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from freshtrack_project.freshtrack_app.models import Product, SellerReviewSummary
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Product.rating_avg/rating_count from reviews and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drifted products, do not fix them',
+        )
+
+    def handle(self, *args, **options):
+        drifted = Product.objects.rating_drift()
+        drift = drifted.count()
+
+        if not options['dry_run']:
+            if drift:
+                Product.objects.rebuild_ratings(product_ids=list(drifted.values_list('pk', flat=True)))
+            # Reviews follow deletes (cascades included); this catches bulk updates and raw SQL
+            seller_ids = SellerReviewSummary.objects.values_list('seller_id', flat=True)
+            for seller_id in seller_ids:
+                SellerReviewSummary.refresh(seller_id)
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(f'{verb} {drift} product(s) with stale rating aggregates')
+
+        if drift:
+            self.stdout.write(self.style.WARNING(f'Total drift: {drift} product(s)'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Rating aggregates are in sync for all products'))
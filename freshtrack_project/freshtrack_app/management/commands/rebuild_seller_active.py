@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from freshtrack_project.freshtrack_app.models import Product
+from freshtrack_project.freshtrack_app.widget_cache import WidgetCache
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Product.seller_active from seller approval status and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drifted products, do not fix them',
+        )
+
+    def handle(self, *args, **options):
+        approved = {'seller__user__role__is_approved': 'approved'}
+
+        # Flag is off but the seller is approved
+        should_be_active = Product.objects.filter(seller_active=False, **approved)
+        # Flag is on but the seller is pending, rejected or has no role
+        should_be_inactive = Product.objects.filter(seller_active=True).exclude(**approved)
+
+        if options['dry_run']:
+            activated = should_be_active.count()
+            deactivated = should_be_inactive.count()
+        else:
+            activated = should_be_active.update(seller_active=True)
+            deactivated = should_be_inactive.update(seller_active=False)
+            if activated or deactivated:
+                WidgetCache.invalidate()
+
+        drift = activated + deactivated
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(f'{verb} {activated} product(s) that should be visible (seller approved)')
+        self.stdout.write(f'{verb} {deactivated} product(s) that should be hidden (seller not approved)')
+
+        if drift:
+            self.stdout.write(self.style.WARNING(f'Total drift: {drift} product(s)'))
+        else:
+            self.stdout.write(self.style.SUCCESS('seller_active is in sync for all products'))
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 04:09
+
+from django.db import migrations, models
+
+
+def populate_seller_active(apps, schema_editor):
+    Product = apps.get_model('freshtrack_app', 'Product')
+    Product.objects.filter(seller__user__role__is_approved='approved').update(seller_active=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('freshtrack_app', '0012_product_visibility_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='seller_active',
+            field=models.BooleanField(default=False, help_text="Denormalized copy of seller approval (UserRole.is_approved == 'approved')"),
+        ),
+        migrations.RunPython(populate_seller_active, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('seller_active', True)), fields=['status', 'expiry_datetime'], name='product_visible_idx'),
+        ),
+    ]
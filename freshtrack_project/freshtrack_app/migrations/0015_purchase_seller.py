@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 04:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('freshtrack_app', '0014_product_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchase',
+            name='seller',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales', to='freshtrack_app.sellerprofile'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['seller', 'purchased_at'], name='purchase_seller_date_idx'),
+        ),
+    ]
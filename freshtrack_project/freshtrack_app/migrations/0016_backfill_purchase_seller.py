@@ -0,0 +1,56 @@
+# Generated by Django 4.2 on 2026-10-18 04:16
+
+from collections import defaultdict, Counter
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_purchase_seller(apps, schema_editor):
+    """
+    Link existing purchases to their seller, BATCH_SIZE rows at a time.
+    Uses the product's seller when the product still exists, otherwise
+    falls back to an unambiguous SellerProfile.company_name match.
+    """
+    Purchase = apps.get_model('freshtrack_app', 'Purchase')
+    SellerProfile = apps.get_model('freshtrack_app', 'SellerProfile')
+
+    names = list(SellerProfile.objects.values_list('company_name', 'id'))
+    name_counts = Counter(name for name, _ in names)
+    seller_by_name = {name: pk for name, pk in names if name_counts[name] == 1}
+
+    last_pk = 0
+    while True:
+        batch = list(
+            Purchase.objects.filter(pk__gt=last_pk, seller__isnull=True)
+            .order_by('pk')
+            .values_list('pk', 'product__seller_id', 'seller_name')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+
+        ids_by_seller = defaultdict(list)
+        for pk, product_seller_id, seller_name in batch:
+            seller_id = product_seller_id or seller_by_name.get(seller_name)
+            if seller_id:
+                ids_by_seller[seller_id].append(pk)
+
+        for seller_id, ids in ids_by_seller.items():
+            Purchase.objects.filter(pk__in=ids).update(seller_id=seller_id)
+
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    # Each batch commits on its own instead of one long write lock
+    atomic = False
+
+    dependencies = [
+        ('freshtrack_app', '0015_purchase_seller'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_purchase_seller, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-18 04:18
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('freshtrack_app', 'Product')
+    Review = apps.get_model('freshtrack_app', 'Review')
+    reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    Product.objects.filter(pk__in=Review.objects.values('product')).update(
+        rating_count=Coalesce(Subquery(reviews.annotate(c=Count('id')).values('c')), Value(0)),
+        rating_avg=Coalesce(
+            Subquery(reviews.annotate(a=Avg('rating')).values('a')), Value(0.0),
+            output_field=models.FloatField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('freshtrack_app', '0016_backfill_purchase_seller'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0, help_text='Denormalized average of review ratings'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, help_text='Denormalized number of reviews'),
+        ),
+        migrations.RunPython(populate_rating_aggregates, migrations.RunPython.noop),
+    ]
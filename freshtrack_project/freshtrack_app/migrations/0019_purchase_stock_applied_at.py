@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, Now
+
+
+def mark_paid_purchases_applied(apps, schema_editor):
+    # Stock was already taken off for every purchase paid before this migration
+    Purchase = apps.get_model('freshtrack_app', 'Purchase')
+    Purchase.objects.filter(payment_status='success').update(
+        stock_applied_at=Coalesce('payment_completed_at', Now())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('freshtrack_app', '0018_seller_review_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchase',
+            name='stock_applied_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_paid_purchases_applied, migrations.RunPython.noop),
+    ]
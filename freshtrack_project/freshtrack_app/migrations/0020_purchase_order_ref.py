@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 10:05
+
+from django.db import migrations, models
+from django.db.models import Value
+from django.db.models.functions import StrIndex, Substr
+
+
+def populate_order_ref(apps, schema_editor):
+    # Cart purchases were stored as "<order tran_id>-<cart item id>"
+    Purchase = apps.get_model('freshtrack_app', 'Purchase')
+    Purchase.objects.filter(transaction_id__contains='-').update(
+        order_ref=Substr('transaction_id', 1, StrIndex('transaction_id', Value('-')) - 1)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('freshtrack_app', '0019_purchase_stock_applied_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchase',
+            name='order_ref',
+            field=models.CharField(blank=True, db_index=True, max_length=32, null=True),
+        ),
+        migrations.RunPython(populate_order_ref, migrations.RunPython.noop),
+    ]
@@ -3,7 +3,9 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
-from django.db.models import Q
+from django.db.models import Q, F, Case, When, Value, Count, Avg, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from .widget_cache import WidgetCache
 
 class ProductManager(models.Manager):
     """Custom manager for Product model with visibility filtering"""
@@ -15,13 +17,15 @@ class ProductManager(models.Manager):
         2. Not expired (expiry_datetime > now)
         3. From approved sellers (seller is approved)
         
+        Seller approval is read from the denormalized Product.seller_active
+        flag, so the filter stays on the product table.
         Use this for buyer-facing views and public product listings.
         """
         return self.filter(
             status='approved',
-            expiry_datetime__gt=timezone.now(),
-            seller__user__role__is_approved='approved'
-        ).select_related('seller', 'seller__user', 'seller__user__role')
+            seller_active=True,
+            expiry_datetime__gt=timezone.now()
+        ).select_related('seller', 'seller__user')
     
     def pending_products(self):
         """Returns products awaiting admin approval"""
@@ -35,6 +39,116 @@ class ProductManager(models.Manager):
         """Returns rejected products"""
         return self.filter(status='rejected').select_related('seller', 'seller__user')
     
+    def admin_listing(self, status='', seller='', expiry=''):
+        """
+        Products for the admin moderation table with server-side filters.
+        Unknown or malformed filter values are ignored.
+        
+        status: one of STATUS_CHOICES
+        seller: SellerProfile id
+        expiry: '24h', '48h' (expiring within) or 'expired' (past expiry time)
+        """
+        queryset = self.select_related('seller', 'seller__user')
+        
+        if status in dict(self.model.STATUS_CHOICES):
+            queryset = queryset.filter(status=status)
+        
+        if str(seller).isdigit():
+            queryset = queryset.filter(seller_id=int(seller))
+        
+        now = timezone.now()
+        if expiry in ('24h', '48h'):
+            queryset = queryset.filter(
+                expiry_datetime__gt=now,
+                expiry_datetime__lte=now + timedelta(hours=int(expiry[:-1])),
+            )
+        elif expiry == 'expired':
+            queryset = queryset.filter(expiry_datetime__lte=now)
+        
+        return queryset
+    
+    def status_counts(self, seller=None, expiring_within=(24,)):
+        """
+        Count products per status plus approved products expiring within
+        each of the given hour windows, in a single aggregate query.
+        
+        Returns e.g. {'total': 10, 'pending': 2, 'approved': 6, 'rejected': 1,
+        'expired': 1, 'expiring_24h': 3}
+        """
+        queryset = self.all() if seller is None else self.filter(seller=seller)
+        now = timezone.now()
+        
+        counts = {'total': Count('id')}
+        for status, _ in self.model.STATUS_CHOICES:
+            counts[status] = Count('id', filter=Q(status=status))
+        for hours in expiring_within:
+            counts[f'expiring_{hours}h'] = Count('id', filter=Q(
+                status='approved',
+                expiry_datetime__gt=now,
+                expiry_datetime__lte=now + timedelta(hours=hours),
+            ))
+        return queryset.aggregate(**counts)
+    
+    def apply_rating_change(self, product_id, added=None, removed=None):
+        """
+        Incrementally update a product's stored rating_avg/rating_count in one UPDATE.
+        Pass added=<rating> for a new review, removed=<rating> for a deleted one,
+        or both (old as removed, new as added) when a review's rating changes.
+        """
+        count_delta = (added is not None) - (removed is not None)
+        rating_delta = (added or 0) - (removed or 0)
+        if count_delta == 0 and rating_delta == 0:
+            return 0
+        
+        new_count = F('rating_count') + count_delta
+        return self.filter(pk=product_id).update(
+            rating_count=Greatest(new_count, Value(0)),
+            rating_avg=Case(
+                When(rating_count__lte=-count_delta, then=Value(0.0)),
+                default=(F('rating_avg') * F('rating_count') + rating_delta) / new_count,
+                output_field=models.FloatField(),
+            ),
+        )
+    
+    def _review_stat_expressions(self):
+        """(count, avg) correlated subqueries over the Review table"""
+        reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+        actual_count = Coalesce(Subquery(reviews.annotate(c=Count('id')).values('c')), Value(0))
+        actual_avg = Coalesce(
+            Subquery(reviews.annotate(a=Avg('rating')).values('a')), Value(0.0),
+            output_field=models.FloatField(),
+        )
+        return actual_count, actual_avg
+    
+    def rating_drift(self):
+        """Products whose stored rating_avg/rating_count no longer match their reviews"""
+        actual_count, actual_avg = self._review_stat_expressions()
+        return self.annotate(
+            actual_rating_count=actual_count,
+            actual_rating_avg=actual_avg,
+        ).filter(
+            ~Q(rating_count=F('actual_rating_count'))
+            | Q(rating_avg__gt=F('actual_rating_avg') + 0.001)
+            | Q(rating_avg__lt=F('actual_rating_avg') - 0.001)
+        )
+    
+    def rebuild_ratings(self, product_ids=None):
+        """Recompute rating_avg/rating_count from reviews in one UPDATE (all products by default)"""
+        actual_count, actual_avg = self._review_stat_expressions()
+        queryset = self.all() if product_ids is None else self.filter(pk__in=product_ids)
+        return queryset.update(rating_count=actual_count, rating_avg=actual_avg)
+    
+    def expire_due(self, now=None):
+        """
+        Mark every product whose expiry time has passed as expired.
+        Runs as a single UPDATE and returns the number of products changed.
+        """
+        now = now or timezone.now()
+        expired = self.filter(expiry_datetime__lte=now).exclude(status='expired').update(status='expired')
+        if expired:
+            WidgetCache.invalidate()
+        return expired
+    
     def expired_products(self):
         """Returns expired products"""
         return self.filter(
@@ -63,27 +177,70 @@ class SellerProfile(models.Model):
         except:
             return False
     
+    def _update_products(self, **fields):
+        """Bulk-update this seller's products and mark catalog widgets stale"""
+        updated = self.products.update(**fields)
+        if updated:
+            WidgetCache.invalidate()
+        return updated
+    
     def hide_all_products(self):
         """Hide all products when seller is rejected"""
-        self.products.update(status='rejected')
+        return self._update_products(status='rejected')
+    
+    def hold_all_products(self):
+        """Move all products back to pending review while seller is on hold"""
+        return self._update_products(status='pending')
     
     def restore_products(self):
         """Restore products to their previous state when seller is re-approved"""
         # Products that were rejected due to seller rejection can be set back to pending
         # Admin still needs to approve them individually
-        self.products.filter(status='rejected').update(status='pending')
+        return self._update_products(
+            status=Case(
+                When(status='rejected', then=Value('pending')),
+                default=F('status'),
+            ),
+        )
+    
+    def compute_review_summary(self):
+        """Histogram, total and average of this seller's review ratings from one GROUP BY query"""
+        rows = Review.objects.filter(product__seller=self).order_by().values('rating').annotate(
+            count=Count('id')
+        )
+        return summarize_ratings({row['rating']: row['count'] for row in rows})
+    
+    def get_review_summary(self, cached=False):
+        """
+        Review summary dict: total, average, counts and breakdown (percent per star).
+        With cached=True the stored SellerReviewSummary row is used (and created on first use).
+        """
+        if not cached:
+            return self.compute_review_summary()
+        try:
+            return self.review_summary.as_dict()
+        except SellerReviewSummary.DoesNotExist:
+            return SellerReviewSummary.refresh(self).as_dict()
     
     def get_rating_breakdown(self):
         """Returns percentage of each star rating"""
-        total_reviews = Review.objects.filter(product__seller=self).count()
-        if total_reviews == 0:
-            return {5: 0, 4: 0, 3: 0, 2: 0, 1: 0}
-        
-        breakdown = {}
-        for star in range(1, 6):
-            count = Review.objects.filter(product__seller=self, rating=star).count()
-            breakdown[star] = round((count / total_reviews) * 100, 1)
-        return breakdown
+        return self.compute_review_summary()['breakdown']
+
+
+def summarize_ratings(counts):
+    """Build a review summary dict from a {star: count} mapping"""
+    counts = {star: counts.get(star, 0) for star in range(5, 0, -1)}
+    total = sum(counts.values())
+    if total == 0:
+        return {'total': 0, 'average': 0, 'counts': counts, 'breakdown': {star: 0 for star in counts}}
+    
+    average = sum(star * count for star, count in counts.items()) / total
+    return {
+        'total': total,
+        'average': round(average, 1),
+        'counts': counts,
+        'breakdown': {star: round((count / total) * 100, 1) for star, count in counts.items()},
+    }
 
 class Product(models.Model):
     STATUS_CHOICES = [
@@ -103,22 +260,51 @@ class Product(models.Model):
     manufacturing_date = models.DateTimeField()
     expiry_datetime = models.DateTimeField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    seller_active = models.BooleanField(default=False, help_text="Denormalized copy of seller approval (UserRole.is_approved == 'approved')")
+    rating_avg = models.FloatField(default=0, help_text="Denormalized average of review ratings")
+    rating_count = models.PositiveIntegerField(default=0, help_text="Denormalized number of reviews")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     # Custom manager
     objects = ProductManager()
 
+    class Meta:
+        indexes = [
+            # Buyer visibility: status='approved' AND expiry_datetime > now, ordered by expiry
+            models.Index(fields=['status', 'expiry_datetime'], name='product_status_expiry_idx'),
+            # approved_available(): partial index covering only products of approved sellers
+            models.Index(
+                fields=['status', 'expiry_datetime'],
+                condition=Q(seller_active=True),
+                name='product_visible_idx',
+            ),
+            # Seller dashboards: a seller's products filtered by status
+            models.Index(fields=['seller', 'status'], name='product_seller_status_idx'),
+            # Newest-first listings filtered by status
+            models.Index(fields=['status', 'created_at'], name='product_status_created_idx'),
+            # Keyset pagination cursor over (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         # Store original price if not set
         if self.original_price is None:
             self.original_price = self.price
         
-        # Auto-update status to expired if time has passed
-        if timezone.now() >= self.expiry_datetime and self.status != 'expired':
-            self.status = 'expired'
+        # New products inherit the seller's current approval state
+        if self._state.adding:
+            self.seller_active = self.seller.is_active()
         
+        # Status is flipped to 'expired' by the expire_products sweeper,
+        # buyer visibility already excludes products past expiry_datetime
         super().save(*args, **kwargs)
+        WidgetCache.invalidate()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        WidgetCache.invalidate()
+        return result
     
     def is_visible_to_buyers(self):
         """
@@ -128,14 +314,11 @@ class Product(models.Model):
         2. Product is not expired
         3. Seller is approved
         """
-        try:
-            return (
-                self.status == 'approved' and
-                timezone.now() < self.expiry_datetime and
-                self.seller.user.role.is_approved == 'approved'
-            )
-        except:
-            return False
+        return (
+            self.status == 'approved' and
+            self.seller_active and
+            timezone.now() < self.expiry_datetime
+        )
 
     def remaining_seconds(self):
         """Returns remaining seconds until expiry"""
@@ -219,16 +402,14 @@ class Product(models.Model):
         return True
 
     def get_average_rating(self):
-        """Calculate average rating from reviews"""
-        reviews = self.reviews.all()
-        if not reviews:
+        """Average rating from the stored aggregate (kept in sync by Review.save/delete)"""
+        if not self.rating_count:
             return 0
-        total = sum(review.rating for review in reviews)
-        return round(total / len(reviews), 1)
+        return round(self.rating_avg, 1)
     
     def get_rating_count(self):
         """Get total number of reviews"""
-        return self.reviews.count()
+        return self.rating_count
     
     def get_rating_stars(self):
         """Get rating as stars display"""
@@ -259,9 +440,103 @@ class Review(models.Model):
         ordering = ['-created_at']
         unique_together = ['product', 'buyer']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rating so save() can apply the difference to the product
+        instance._loaded_rating = instance.__dict__.get('rating')
+        return instance
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        
+        if adding:
+            Product.objects.apply_rating_change(self.product_id, added=self.rating)
+            SellerReviewSummary.refresh_existing(self.product.seller_id)
+        else:
+            loaded = getattr(self, '_loaded_rating', None)
+            if loaded is not None and loaded != self.rating:
+                Product.objects.apply_rating_change(self.product_id, added=self.rating, removed=loaded)
+                SellerReviewSummary.refresh_existing(self.product.seller_id)
+        self._loaded_rating = self.rating
+
     def __str__(self):
         return f"{self.buyer.username} - {self.product.name} - {self.rating}★"
 
+class SellerReviewSummary(models.Model):
+    """
+    Cached per-seller review summary, refreshed whenever one of the seller's reviews changes.
+    Review.save() refreshes it; deletes (including cascades) go through the post_delete
+    receivers below, connected in FreshtrackAppConfig.ready().
+    """
+    seller = models.OneToOneField(SellerProfile, on_delete=models.CASCADE, related_name='review_summary')
+    total_reviews = models.PositiveIntegerField(default=0)
+    average_rating = models.FloatField(default=0)
+    star_1 = models.PositiveIntegerField(default=0)
+    star_2 = models.PositiveIntegerField(default=0)
+    star_3 = models.PositiveIntegerField(default=0)
+    star_4 = models.PositiveIntegerField(default=0)
+    star_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def refresh(cls, seller):
+        """Recompute and store the summary for seller (a SellerProfile or its id)"""
+        seller_id = getattr(seller, 'pk', seller)
+        summary = SellerProfile(pk=seller_id).compute_review_summary()
+        counts = summary['counts']
+        row, _ = cls.objects.update_or_create(
+            seller_id=seller_id,
+            defaults={
+                'total_reviews': summary['total'],
+                'average_rating': summary['average'],
+                **{f'star_{star}': counts[star] for star in counts},
+            },
+        )
+        return row
+
+    @classmethod
+    def refresh_existing(cls, seller_id):
+        """Refresh the seller's summary only if one has been cached already"""
+        if cls.objects.filter(seller_id=seller_id).exists():
+            cls.refresh(seller_id)
+
+    def as_dict(self):
+        return summarize_ratings({star: getattr(self, f'star_{star}') for star in range(1, 6)})
+
+    def __str__(self):
+        return f"{self.seller.company_name} - {self.total_reviews} reviews"
+
+
+def _deleted_from(origin, model):
+    """True when a delete was started on a `model` instance or queryset"""
+    return isinstance(origin, model) or getattr(origin, 'model', None) is model
+
+
+def refresh_summary_on_product_delete(sender, instance, origin=None, **kwargs):
+    """post_delete receiver: a deleted product takes its reviews with it (sell-out, seller cleanup)"""
+    # Products removed along with their seller take the summary with them as well
+    if _deleted_from(origin, Product):
+        SellerReviewSummary.refresh_existing(instance.seller_id)
+
+
+def remove_rating_on_review_delete(sender, instance, origin=None, **kwargs):
+    """post_delete receiver: take a deleted review (Review.delete() or a cascade) off its product's rating"""
+    if _deleted_from(origin, Product):
+        return  # the product row is going as well
+    rating = getattr(instance, '_loaded_rating', None) or instance.rating
+    Product.objects.apply_rating_change(instance.product_id, removed=rating)
+
+
+def refresh_summary_on_review_delete(sender, instance, origin=None, **kwargs):
+    """post_delete receiver: covers Review.delete() and cascades from purchases and buyers"""
+    if _deleted_from(origin, Product):
+        return  # refresh_summary_on_product_delete refreshes once per product
+    seller_id = Product.objects.filter(pk=instance.product_id).values_list('seller_id', flat=True).first()
+    if seller_id is not None:
+        SellerReviewSummary.refresh_existing(seller_id)
+
 class Alert(models.Model):
     ALERT_TYPE_CHOICES = [
         ('seller', 'Seller Alert'),
@@ -309,12 +584,32 @@ class UserRole(models.Model):
     approved_at = models.DateTimeField(null=True, blank=True)
     rejected_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_approved'], name='userrole_is_approved_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.role}"
     
     def is_seller_active(self):
         """Check if this is an active approved seller"""
         return self.role == 'seller' and self.is_approved == 'approved'
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Approval changes from the moderation views, the Django admin and scripts all pass here
+        self.sync_products_seller_active()
+    
+    def sync_products_seller_active(self):
+        """Copy this user's approval state onto Product.seller_active (one UPDATE, only rows that differ)"""
+        active = self.is_approved == 'approved'
+        updated = Product.objects.filter(seller__user_id=self.user_id).exclude(
+            seller_active=active
+        ).update(seller_active=active)
+        if updated:
+            WidgetCache.invalidate()
+        return updated
 
 class Purchase(models.Model):
     PAYMENT_STATUS_CHOICES = [
@@ -336,6 +631,7 @@ class Purchase(models.Model):
     
     buyer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='purchases')
     product = models.ForeignKey('Product', on_delete=models.SET_NULL, null=True, blank=True)
+    seller = models.ForeignKey(SellerProfile, on_delete=models.SET_NULL, null=True, blank=True, related_name='sales')
     product_name = models.CharField(max_length=255)
     seller_name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -346,16 +642,25 @@ class Purchase(models.Model):
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, null=True, blank=True)
     transaction_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    # Groups the purchases of one cart checkout: the tran_id sent to the gateway for the whole cart
+    order_ref = models.CharField(max_length=32, null=True, blank=True, db_index=True)
     gateway_response = models.TextField(null=True, blank=True, help_text="JSON response from payment gateway")
     
     purchased_at = models.DateTimeField(auto_now_add=True)
     payment_completed_at = models.DateTimeField(null=True, blank=True)
+    # Idempotency marker: set once by stock.apply_purchase() when this payment's stock
+    # and seller totals are applied; later callbacks for the same payment see it and skip
+    stock_applied_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.buyer.username} - {self.product_name} - {self.payment_status}"
     
     class Meta:
         ordering = ['-purchased_at']
+        indexes = [
+            # Seller sales pages: a seller's purchases within a date range
+            models.Index(fields=['seller', 'purchased_at'], name='purchase_seller_date_idx'),
+        ]
 
 class Cart(models.Model):
     """Shopping cart for buyers to add multiple products before checkout"""
@@ -0,0 +1,90 @@
+"""
+Keyset (cursor) pagination for product listings
+- Pages are ordered newest first by (created_at, id)
+- Cursors are opaque URL-safe strings, so a page never needs OFFSET or COUNT(*)
+"""
+
+import base64
+import binascii
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class KeysetPage:
+    """One page of rows plus the cursors to its neighbours"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(obj, direction='next'):
+    """Build a cursor pointing just past obj in the given direction"""
+    raw = f"{direction}|{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns (direction, created_at, pk), or None for a missing or malformed cursor"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, created_at, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+        created_at = parse_datetime(created_at)
+        if direction not in ('next', 'prev') or created_at is None:
+            return None
+        return direction, created_at, int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def keyset_paginate(queryset, cursor=None, page_size=25):
+    """
+    Return a KeysetPage of queryset ordered by -created_at, -id.
+    Fetches page_size + 1 rows to know whether another page exists.
+    """
+    decoded = decode_cursor(cursor)
+
+    if decoded and decoded[0] == 'prev':
+        # Walk backwards (oldest first) from the cursor, then restore newest-first order
+        _, created_at, pk = decoded
+        rows = list(queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+        ).order_by('created_at', 'id')[:page_size + 1])
+        has_prev = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = True
+    else:
+        queryset = queryset.order_by('-created_at', '-id')
+        has_prev = decoded is not None
+        if decoded:
+            _, created_at, pk = decoded
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+        rows = list(queryset[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+    if not rows:
+        return KeysetPage([])
+
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1], 'next') if has_next else None,
+        prev_cursor=encode_cursor(rows[0], 'prev') if has_prev else None,
+    )
@@ -0,0 +1,143 @@
+"""
+Structured logging for the payment flow
+- log_payment('event', transaction_id=..., status=...) writes one key=value record
+  on the 'freshtrack.payments' logger
+- QueueingStreamHandler only puts records on an in-memory queue; a background
+  QueueListener formats and writes them, so request threads never block on stdout
+- RedactingFilter masks store credentials before a record leaves the request thread
+- Level is controlled by PAYMENT_LOG_LEVEL (see LOGGING in settings.py)
+"""
+
+import atexit
+import copy
+import json
+import logging
+import queue
+import re
+from logging.handlers import QueueHandler, QueueListener
+from django.conf import settings
+
+logger = logging.getLogger('freshtrack.payments')
+
+# Characters that would make a key=value token ambiguous
+_NEEDS_QUOTES = re.compile(r'[\s="]')
+
+REDACTED = '[REDACTED]'
+# Field names whose values are never logged
+SENSITIVE_FIELDS = {'store_id', 'store_passwd', 'store_password', 'password', 'card_no', 'card_number'}
+
+
+def log_payment(event, level=logging.INFO, **fields):
+    """Log one payment event with structured fields (skipped cheaply when the level is off)"""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={'fields': fields})
+
+
+def _redact(value, secrets):
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if str(key).lower() in SENSITIVE_FIELDS else _redact(item, secrets)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [_redact(item, secrets) for item in value]
+    if isinstance(value, str):
+        for secret in secrets:
+            value = value.replace(secret, REDACTED)
+    return value
+
+
+class RedactingFilter(logging.Filter):
+    """Mask store credentials in a record's fields and message"""
+
+    def filter(self, record):
+        secrets = [
+            secret for secret in (
+                getattr(settings, 'SSLCOMMERZ_STORE_PASSWORD', ''),
+                getattr(settings, 'SSLCOMMERZ_STORE_ID', ''),
+            ) if secret
+        ]
+        fields = getattr(record, 'fields', None)
+        if fields:
+            record.fields = _redact(fields, secrets)
+        if isinstance(record.msg, str):
+            record.msg = _redact(record.msg, secrets)
+        return True
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Render records as: time level logger event key=value ..."""
+
+    @staticmethod
+    def format_value(value):
+        """
+        One value as a single token: dicts and lists become compact JSON, and anything
+        empty or containing whitespace, '=' or '"' is JSON-quoted (which also escapes \\n
+        and \\r), so a gateway message can never break a record into several lines or fields
+        """
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value, default=str, separators=(',', ':'))
+        else:
+            value = str(value)
+        if not value or _NEEDS_QUOTES.search(value):
+            return json.dumps(value)
+        return value
+
+    def format(self, record):
+        parts = [
+            self.formatTime(record),
+            record.levelname,
+            record.name,
+            record.getMessage(),
+        ]
+        for key, value in getattr(record, 'fields', {}).items():
+            parts.append(f'{key}={self.format_value(value)}')
+        line = ' '.join(parts)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+class QueueingStreamHandler(QueueHandler):
+    """
+    Non-blocking handler: enqueue records and let a background listener write them
+    to a StreamHandler (stderr by default) with KeyValueFormatter.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        target = logging.StreamHandler(stream)
+        target.setFormatter(KeyValueFormatter())
+        self.listener = QueueListener(self.queue, target, respect_handler_level=False)
+        self.listener.start()
+        self._running = True
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Flush queued records and stop the listener thread (safe to call twice)"""
+        if self._running:
+            self._running = False
+            self.listener.stop()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Drop rather than block a payment request when the writer falls behind
+            pass
+
+    def prepare(self, record):
+        # Keep exc_info as text and leave `fields` for the listener thread to format
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def close(self):
+        self.stop()
+        super().close()
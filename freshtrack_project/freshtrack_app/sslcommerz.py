@@ -0,0 +1,106 @@
+"""
+SSLCommerz gateway client
+- One shared requests.Session per process, so calls reuse pooled keep-alive
+  connections instead of a new TCP + TLS handshake each time
+- Every call has a (connect, read) timeout
+- Validation is an idempotent GET and is retried with exponential backoff on connection
+  errors and 502/503/504; payment initiation (POST) is never retried
+- ainitiate()/avalidate() run the same pooled calls for async views on the client's own
+  thread pool, sized like the connection pool, so slow gateway calls from many concurrent
+  callbacks wait in parallel instead of queueing on the small default executor
+"""
+
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class SSLCommerzClient:
+    """Pooled HTTP client for the SSLCommerz initiation and validation APIs"""
+
+    def __init__(self, api_url=None, validation_url=None, store_id=None, store_password=None,
+                 connect_timeout=None, read_timeout=None, validation_retries=None,
+                 backoff_factor=0.5, pool_maxsize=None):
+        self.api_url = api_url or settings.SSLCOMMERZ_API_URL
+        self.validation_url = validation_url or settings.SSLCOMMERZ_VALIDATION_URL
+        self.store_id = store_id or settings.SSLCOMMERZ_STORE_ID
+        self.store_password = store_password or settings.SSLCOMMERZ_STORE_PASSWORD
+        self.timeout = (
+            connect_timeout or getattr(settings, 'SSLCOMMERZ_CONNECT_TIMEOUT', 5),
+            read_timeout or getattr(settings, 'SSLCOMMERZ_READ_TIMEOUT', 20),
+        )
+        if validation_retries is None:
+            validation_retries = getattr(settings, 'SSLCOMMERZ_VALIDATION_RETRIES', 3)
+        pool_maxsize = pool_maxsize or getattr(settings, 'SSLCOMMERZ_POOL_SIZE', 20)
+
+        retry = Retry(
+            total=validation_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({'GET'}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=pool_maxsize, thread_name_prefix='sslcommerz')
+
+    def initiate(self, payment_data, timeout=None):
+        """POST a payment session request; store credentials are added here. Returns the Response."""
+        data = {
+            **payment_data,
+            'store_id': self.store_id,
+            'store_passwd': self.store_password,
+        }
+        return self.session.post(self.api_url, data=data, timeout=timeout or self.timeout)
+
+    def validate(self, val_id, timeout=None):
+        """GET the validation result for val_id (retried with backoff). Returns the Response."""
+        params = {
+            'val_id': val_id,
+            'store_id': self.store_id,
+            'store_passwd': self.store_password,
+        }
+        return self.session.get(self.validation_url, params=params, timeout=timeout or self.timeout)
+
+    async def ainitiate(self, payment_data, timeout=None):
+        return await sync_to_async(self.initiate, thread_sensitive=False, executor=self.executor)(
+            payment_data, timeout
+        )
+
+    async def avalidate(self, val_id, timeout=None):
+        return await sync_to_async(self.validate, thread_sensitive=False, executor=self.executor)(
+            val_id, timeout
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide SSLCommerzClient (created on first use)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SSLCommerzClient()
+    return _client
+
+
+def reset_client():
+    """Drop the shared client, e.g. after the gateway settings change"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
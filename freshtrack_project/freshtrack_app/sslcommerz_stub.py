@@ -0,0 +1,129 @@
+"""
+Local stub of the SSLCommerz gateway for tests and offline development
+- Answers the initiation POST with status SUCCESS and a GatewayPageURL
+- Answers validation GETs with status VALID (or 503 for the first `fail_validations` calls),
+  after `delay` seconds to stand in for a slow gateway
+- Speaks HTTP/1.1 keep-alive, so pooled clients reuse connections like against the real API
+- Counts requests and new connections so tests can check pooling
+
+    with StubGateway() as gateway:
+        client = SSLCommerzClient(api_url=gateway.api_url, validation_url=gateway.validation_url)
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+API_PATH = '/gwprocess/v4/api.php'
+VALIDATION_PATH = '/validator/api/validationserverAPI.php'
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without TCP_NODELAY keep-alive
+    # connections stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        data = parse_qs(self.rfile.read(length).decode())
+        with self.server.lock:
+            self.server.requests += 1
+        if urlparse(self.path).path != API_PATH:
+            return self._send_json(404, {'status': 'FAILED', 'failedreason': 'Not found'})
+        tran_id = data.get('tran_id', [''])[0]
+        self._send_json(200, {
+            'status': 'SUCCESS',
+            'sessionkey': f'STUB{tran_id}',
+            'GatewayPageURL': f'http://{self.server.server_address[0]}:{self.server.server_address[1]}/pay/{tran_id}',
+        })
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.validations += 1
+            failing = self.server.validations <= self.server.fail_validations
+        if url.path != VALIDATION_PATH:
+            return self._send_json(404, {'status': 'INVALID_TRANSACTION'})
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if failing:
+            return self._send_json(503, {'status': 'UNAVAILABLE'})
+        val_id = params.get('val_id', [''])[0]
+        self._send_json(200, {'status': 'VALID', 'val_id': val_id, 'amount': '0.00'})
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for bursts of concurrent callbacks (the socketserver default backlog is 5)
+    request_queue_size = 128
+
+
+class StubGateway:
+    """Run the stub gateway on a free localhost port in a background thread"""
+
+    def __init__(self, host='127.0.0.1', port=0, fail_validations=0, delay=0):
+        self.server = _StubServer((host, port), _StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = 0
+        self.server.connections = 0
+        self.server.validations = 0
+        self.server.fail_validations = fail_validations
+        self.server.delay = delay
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def api_url(self):
+        return self.base_url + API_PATH
+
+    @property
+    def validation_url(self):
+        return self.base_url + VALIDATION_PATH
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    @property
+    def connections(self):
+        return self.server.connections
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,151 @@
+"""
+Stock changes for paid purchases
+- apply_purchase() marks a purchase paid and takes its quantity off the product exactly once,
+  however many callbacks (browser redirect, IPN, cart success) report the same payment
+- The purchase is claimed with a conditional UPDATE on Purchase.stock_applied_at; only the
+  callback whose UPDATE matched goes on to change stock and seller totals
+- Stock goes down with UPDATE ... SET quantity = quantity - n WHERE quantity >= n, so
+  concurrent payments for one product never lose an update or go below zero
+- Claim, stock and seller totals are one transaction: a failure leaves the purchase unclaimed
+- apply_order() does the same for every purchase of one cart checkout (Purchase.order_ref)
+  with one UPDATE for the claim, one CASE-based UPDATE for all of the order's stock and
+  one UPDATE per seller
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from .models import Product, Purchase, SellerProfile
+from .widget_cache import WidgetCache
+
+
+def decrement_stock(product_id, quantity):
+    """
+    Take `quantity` off a product if that much is in stock; a product that reaches 0 is
+    deleted, as sold-out products always have been. Returns the remaining quantity,
+    or None when the product is missing or has too little stock.
+    """
+    with transaction.atomic(savepoint=False):
+        reduced = Product.objects.filter(pk=product_id, quantity__gte=quantity).update(
+            quantity=F('quantity') - quantity
+        )
+        if not reduced:
+            return None
+        product = Product.objects.only('quantity', 'seller_id').get(pk=product_id)
+        if product.quantity <= 0:
+            product.delete()
+        transaction.on_commit(WidgetCache.invalidate)
+        return product.quantity
+
+
+def apply_purchase(purchase, gateway_response=None):
+    """
+    Mark `purchase` paid and apply its stock and seller-total changes, once.
+    Returns a dict: applied (False when another callback got there first), product_id,
+    stock_after (None when the product is gone or short of stock) and deleted.
+    """
+    now = timezone.now()
+    fields = {'payment_status': 'success', 'payment_completed_at': now, 'stock_applied_at': now}
+    if gateway_response is not None:
+        fields['gateway_response'] = gateway_response
+    result = {'applied': False, 'product_id': purchase.product_id, 'stock_after': None, 'deleted': False}
+
+    with transaction.atomic():
+        claimed = Purchase.objects.filter(pk=purchase.pk, stock_applied_at__isnull=True).update(**fields)
+        if not claimed:
+            return result
+        for name, value in fields.items():
+            setattr(purchase, name, value)
+        result['applied'] = True
+
+        seller_id = purchase.seller_id
+        if purchase.product_id is not None:
+            if seller_id is None:
+                seller_id = Product.objects.filter(pk=purchase.product_id).values_list('seller_id', flat=True).first()
+            stock_after = decrement_stock(purchase.product_id, purchase.quantity)
+            result['stock_after'] = stock_after
+            result['deleted'] = stock_after is not None and stock_after <= 0
+
+        if seller_id is not None:
+            add_seller_sales(seller_id, purchase.quantity, purchase.total_price)
+    return result
+
+
+def decrement_stock_many(ordered):
+    """
+    decrement_stock() for several products at once: `ordered` maps product id to quantity.
+    Runs a fixed number of queries however many products there are. Returns the ids that
+    were missing or had too little stock (those are left unchanged).
+    """
+    with transaction.atomic(savepoint=False):
+        stock = dict(
+            Product.objects.select_for_update().filter(pk__in=list(ordered)).values_list('pk', 'quantity')
+        )
+        available = {
+            product_id: quantity for product_id, quantity in ordered.items()
+            if stock.get(product_id, -1) >= quantity
+        }
+        if available:
+            amount = Case(
+                *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in available.items()],
+                output_field=IntegerField(),
+            )
+            Product.objects.filter(pk__in=list(available), quantity__gte=amount).update(
+                quantity=F('quantity') - amount
+            )
+            sold_out = [
+                product_id for product_id, quantity in available.items()
+                if stock[product_id] - quantity <= 0
+            ]
+            if sold_out:
+                # A queryset delete skips Product.delete(), which is what invalidates the widgets
+                Product.objects.filter(pk__in=sold_out).delete()
+                WidgetCache.invalidate()
+            transaction.on_commit(WidgetCache.invalidate)
+        return [product_id for product_id in ordered if product_id not in available]
+
+
+def add_seller_sales(seller_id, quantity, revenue):
+    """Add to a seller's total_sales/total_revenue in the database (no read-modify-write)"""
+    SellerProfile.objects.filter(pk=seller_id).update(
+        total_sales=F('total_sales') + quantity,
+        total_revenue=F('total_revenue') + revenue,
+    )
+
+
+def apply_order(order_ref, gateway_response=None):
+    """
+    Mark every not-yet-applied purchase of a cart checkout paid and apply their stock and
+    seller-total changes, once. Returns {'applied': number of purchases claimed by this call,
+    'short': product ids whose stock was too low (or that are gone)}.
+    """
+    now = timezone.now()
+    fields = {'payment_status': 'success', 'payment_completed_at': now, 'stock_applied_at': now}
+    if gateway_response is not None:
+        fields['gateway_response'] = gateway_response
+
+    with transaction.atomic():
+        # Claim first: the UPDATE takes the write locks, so a concurrent callback for the same
+        # order matches no rows. Rows claimed here are the ones carrying this call's timestamp.
+        claimed = Purchase.objects.filter(order_ref=order_ref, stock_applied_at__isnull=True).update(**fields)
+        if not claimed:
+            return {'applied': 0, 'short': []}
+        rows = Purchase.objects.filter(order_ref=order_ref, stock_applied_at=now).values_list(
+            'product_id', 'seller_id', 'quantity', 'total_price'
+        )
+
+        ordered = defaultdict(int)
+        sales = defaultdict(lambda: [0, Decimal('0')])
+        for product_id, seller_id, quantity, total_price in rows:
+            if product_id is not None:
+                ordered[product_id] += quantity
+            if seller_id is not None:
+                sales[seller_id][0] += quantity
+                sales[seller_id][1] += total_price
+
+        short = decrement_stock_many(ordered) if ordered else []
+        for seller_id, (quantity, revenue) in sales.items():
+            add_seller_sales(seller_id, quantity, revenue)
+    return {'applied': claimed, 'short': short}
@@ -1,8 +1,40 @@
-from django.test import TestCase, Client
+import asyncio
+import importlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from types import SimpleNamespace
+from unittest import skipUnless
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, AsyncClient, Client, RequestFactory, override_settings
 from django.contrib.auth.models import User
+from django.urls import resolve
 from django.utils import timezone
 from datetime import timedelta
-from .models import Product, SellerProfile, UserRole, Review, Alert
+from decimal import Decimal
+from .models import Product, SellerProfile, SellerReviewSummary, UserRole, Review, Alert, Purchase, Cart
+from .widget_cache import WidgetCache
+from .db_tuning import apply_sqlite_pragmas
+from .db_router import ReplicaRouter, read_replica, replica_reads
+from .instrumentation import PerformanceMiddleware, QueryBudgetExceeded, query_budget
+from .payment_logging import KeyValueFormatter, QueueingStreamHandler, RedactingFilter
+from .sslcommerz import SSLCommerzClient, reset_client
+from .sslcommerz_stub import StubGateway
+from .stock import apply_purchase, decrement_stock, decrement_stock_many
+import requests
+from .tracking_features import AlertEngine, CatalogWidgets, DashboardStats, ReduceWaste, SalesAnalytics, SaveMoney, savings_expression
 
 class UserRegistrationTest(TestCase):
     def test_register_as_buyer(self):
@@ -102,3 +134,1563 @@ class ViewsTest(TestCase):
     def test_register_page(self):
         response = self.client.get('/register/')
         self.assertEqual(response.status_code, 200)
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN output checked against SQLite query plans')
+class ProductQueryPlanTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='seller1', password='testpass123')
+        UserRole.objects.create(user=self.user, role='seller', is_approved='approved')
+        self.seller = SellerProfile.objects.create(user=self.user, company_name='Test Company')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(f'USING INDEX {index_name}', plan)
+        self.assertNotIn('SCAN freshtrack_app_product', plan)
+
+    def test_approved_available_uses_visibility_index(self):
+        queryset = Product.objects.approved_available().order_by('expiry_datetime')
+        self.assertUsesIndex(queryset, 'product_visible_idx')
+        self.assertNotIn('freshtrack_app_userrole', queryset.explain())
+
+    def test_seller_status_lookup_uses_index(self):
+        queryset = Product.objects.filter(seller=self.seller, status='approved')
+        self.assertUsesIndex(queryset, 'product_seller_status_idx')
+
+    def test_seller_sales_use_seller_date_index(self):
+        queryset = Purchase.objects.filter(
+            seller=self.seller, purchased_at__gte=timezone.now() - timedelta(days=7)
+        )
+        self.assertIn('USING INDEX purchase_seller_date_idx', queryset.explain())
+
+class SellerActiveSyncTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin1', password='testpass123', is_staff=True)
+        self.seller_user = User.objects.create_user(username='seller1', password='testpass123')
+        self.role = UserRole.objects.create(user=self.seller_user, role='seller', is_approved='approved')
+        self.seller = SellerProfile.objects.create(user=self.seller_user, company_name='Test Company')
+
+        now = timezone.now()
+        self.product = Product.objects.create(
+            seller=self.seller,
+            name='Fresh Milk',
+            price=2.50,
+            quantity=100,
+            manufacturing_date=now - timedelta(days=1),
+            expiry_datetime=now + timedelta(hours=24),
+            status='approved'
+        )
+        self.client.login(username='admin1', password='testpass123')
+
+    def test_new_product_inherits_seller_approval(self):
+        self.assertTrue(self.product.seller_active)
+        self.assertIn(self.product, Product.objects.approved_available())
+
+    def test_reject_and_approve_user_toggle_visibility(self):
+        self.client.get(f'/moderation/reject-user/{self.role.id}/')
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.seller_active)
+        self.assertEqual(self.product.status, 'rejected')
+
+        self.client.get(f'/moderation/approve-user/{self.role.id}/')
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.seller_active)
+        self.assertEqual(self.product.status, 'pending')
+
+    def test_hold_user_hides_products(self):
+        self.client.get(f'/moderation/hold-user/{self.role.id}/')
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.seller_active)
+        self.assertEqual(self.product.status, 'pending')
+
+    def test_approval_saved_outside_views_updates_products(self):
+        # As the Django admin and SCRIPT_approve_users.py do
+        self.role.is_approved = 'rejected'
+        self.role.save()
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.seller_active)
+        self.assertNotIn(self.product, Product.objects.approved_available())
+
+        role = UserRole.objects.get(pk=self.role.pk)
+        role.is_approved = 'approved'
+        role.save()
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.seller_active)
+        self.assertIn(self.product, Product.objects.approved_available())
+
+    def test_rebuild_command_fixes_drift(self):
+        UserRole.objects.filter(pk=self.role.pk).update(is_approved='rejected')
+        out = StringIO()
+        call_command('rebuild_seller_active', '--dry-run', stdout=out)
+        self.assertIn('Total drift: 1', out.getvalue())
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.seller_active)
+
+        call_command('rebuild_seller_active', stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.seller_active)
+        self.assertNotIn(self.product, Product.objects.approved_available())
+
+class ExpireProductsCommandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='seller1', password='testpass123')
+        UserRole.objects.create(user=self.user, role='seller', is_approved='approved')
+        self.seller = SellerProfile.objects.create(user=self.user, company_name='Test Company')
+
+        now = timezone.now()
+        self.fresh = Product.objects.create(
+            seller=self.seller, name='Fresh Milk', price=2.50, quantity=10,
+            manufacturing_date=now - timedelta(days=1),
+            expiry_datetime=now + timedelta(hours=24), status='approved'
+        )
+        self.stale = Product.objects.create(
+            seller=self.seller, name='Old Milk', price=1.00, quantity=10,
+            manufacturing_date=now - timedelta(days=5),
+            expiry_datetime=now - timedelta(hours=1), status='approved'
+        )
+
+    def test_save_does_not_flip_status(self):
+        self.assertEqual(self.stale.status, 'approved')
+        self.assertNotIn(self.stale, Product.objects.approved_available())
+
+    def test_sweep_marks_only_expired_products(self):
+        out = StringIO()
+        call_command('expire_products', stdout=out)
+        self.assertIn('Marked 1 product(s) as expired', out.getvalue())
+
+        self.stale.refresh_from_db()
+        self.fresh.refresh_from_db()
+        self.assertEqual(self.stale.status, 'expired')
+        self.assertEqual(self.fresh.status, 'approved')
+
+        # Second run has nothing left to do
+        self.assertEqual(Product.objects.expire_due(), 0)
+
+class AlertEngineTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='seller1', password='testpass123')
+        UserRole.objects.create(user=self.user, role='seller', is_approved='approved')
+        self.seller = SellerProfile.objects.create(user=self.user, company_name='Test Company')
+
+        now = timezone.now()
+        for name, hours in [('Last', 0.5), ('Urgent', 3), ('Soon', 12), ('Warning', 36), ('Normal', 100)]:
+            Product.objects.create(
+                seller=self.seller, name=name, price=2.50, quantity=10,
+                manufacturing_date=now - timedelta(days=1),
+                expiry_datetime=now + timedelta(hours=hours), status='approved'
+            )
+
+    def test_run_emits_each_bucket_once(self):
+        result = AlertEngine.run()
+        self.assertEqual(result['products_scanned'], 4)
+        # 4 seller alerts + buyer alerts for last_chance and urgent
+        self.assertEqual(result['alerts_emitted'], 6)
+        self.assertEqual(
+            set(Alert.objects.filter(alert_type='seller').values_list('alert_level', flat=True)),
+            {'last_chance', 'urgent', 'soon', 'warning'}
+        )
+        self.assertEqual(Alert.objects.get(alert_type='seller', product__name='Urgent').priority, 1)
+
+        with self.assertNumQueries(2):
+            result = AlertEngine.run()
+        self.assertEqual(result['alerts_emitted'], 0)
+
+    def test_alerts_page_only_reads(self):
+        self.client.login(username='seller1', password='testpass123')
+        response = self.client.get('/seller/alerts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Alert.objects.exists())
+
+class StatusCountsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='seller1', password='testpass123')
+        UserRole.objects.create(user=self.user, role='seller', is_approved='approved')
+        self.seller = SellerProfile.objects.create(user=self.user, company_name='Test Company')
+        other_user = User.objects.create_user(username='seller2', password='testpass123')
+        UserRole.objects.create(user=other_user, role='seller', is_approved='approved')
+        other_seller = SellerProfile.objects.create(user=other_user, company_name='Other Company')
+
+        now = timezone.now()
+        for seller, status, hours in [
+            (self.seller, 'approved', 12),
+            (self.seller, 'approved', 72),
+            (self.seller, 'pending', 12),
+            (self.seller, 'rejected', 12),
+            (self.seller, 'expired', -1),
+            (other_seller, 'approved', 12),
+        ]:
+            Product.objects.create(
+                seller=seller, name='Milk', price=2.50, quantity=10,
+                manufacturing_date=now - timedelta(days=1),
+                expiry_datetime=now + timedelta(hours=hours), status=status
+            )
+
+    def test_counts_for_seller_in_one_query(self):
+        with self.assertNumQueries(1):
+            counts = Product.objects.status_counts(seller=self.seller, expiring_within=(24, 48))
+        self.assertEqual(counts, {
+            'total': 5, 'pending': 1, 'approved': 2, 'rejected': 1, 'expired': 1,
+            'expiring_24h': 1, 'expiring_48h': 1,
+        })
+
+    def test_counts_for_all_products(self):
+        counts = Product.objects.status_counts()
+        self.assertEqual(counts['total'], 6)
+        self.assertEqual(counts['approved'], 3)
+        self.assertEqual(counts['expiring_24h'], 2)
+
+class AdminDashboardQueryCountTest(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='admin1', password='testpass123', is_staff=True)
+        self.client.login(username='admin1', password='testpass123')
+        self.seller_number = 0
+
+    def add_sellers(self, count):
+        now = timezone.now()
+        for _ in range(count):
+            self.seller_number += 1
+            user = User.objects.create_user(username=f'seller{self.seller_number}', password='testpass123')
+            UserRole.objects.create(user=user, role='seller', is_approved='approved')
+            seller = SellerProfile.objects.create(user=user, company_name=f'Company {self.seller_number}')
+            for status in ['approved', 'pending', 'rejected']:
+                Product.objects.create(
+                    seller=seller, name='Milk', price=2.50, quantity=10,
+                    manufacturing_date=now - timedelta(days=1),
+                    expiry_datetime=now + timedelta(hours=24), status=status
+                )
+
+    def count_dashboard_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/moderation/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_independent_of_seller_count(self):
+        self.add_sellers(2)
+        baseline = self.count_dashboard_queries()
+        self.add_sellers(10)
+        self.assertEqual(self.count_dashboard_queries(), baseline)
+
+    def test_seller_count(self):
+        self.add_sellers(3)
+        response = self.client.get('/moderation/')
+        self.assertEqual(response.context['seller_count'], 3)
+        self.assertContains(response, 'Sellers (3)')
+
+class AdminProductsPaginationTest(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='admin1', password='testpass123', is_staff=True)
+        self.client.login(username='admin1', password='testpass123')
+
+        user = User.objects.create_user(username='seller1', password='testpass123')
+        UserRole.objects.create(user=user, role='seller', is_approved='approved')
+        self.seller = SellerProfile.objects.create(user=user, company_name='Test Company')
+
+        now = timezone.now()
+        for i in range(30):
+            Product.objects.create(
+                seller=self.seller, name=f'Product {i}', price=2.50, quantity=10,
+                manufacturing_date=now - timedelta(days=1),
+                expiry_datetime=now + timedelta(hours=12 if i % 2 else 100),
+                status='approved' if i % 3 else 'pending'
+            )
+
+    def fetch_all(self, params):
+        ids, cursor = [], None
+        while True:
+            query = dict(params, cursor=cursor) if cursor else params
+            data = self.client.get('/api/admin/products/', query).json()
+            ids.extend(row['id'] for row in data['products'])
+            cursor = data['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_cursor_walk_covers_every_product_once(self):
+        ids = self.fetch_all({})
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_cursor_returns_same_page(self):
+        first = self.client.get('/api/admin/products/').json()
+        second = self.client.get('/api/admin/products/', {'cursor': first['next_cursor']}).json()
+        back = self.client.get('/api/admin/products/', {'cursor': second['prev_cursor']}).json()
+        self.assertEqual([p['id'] for p in back['products']], [p['id'] for p in first['products']])
+        self.assertIsNone(back['prev_cursor'])
+
+    def test_server_side_filters(self):
+        ids = self.fetch_all({'status': 'pending', 'expiry': '24h', 'seller': str(self.seller.id)})
+        expected = Product.objects.filter(
+            status='pending', expiry_datetime__lte=timezone.now() + timedelta(hours=24)
+        )
+        self.assertEqual(set(ids), set(expected.values_list('id', flat=True)))
+
+    def test_html_page_renders_one_page(self):
+        response = self.client.get('/moderation/products/', {'status': 'approved'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['products']), 20)
+        self.assertFalse(response.context['products'].has_next())
+
+    def test_api_requires_admin(self):
+        self.client.login(username='seller1', password='testpass123')
+        self.assertEqual(self.client.get('/api/admin/products/').status_code, 403)
+
+@override_settings(TIME_ZONE='Asia/Dhaka')
+class ExpiryBucketsTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='seller1', password='testpass123')
+        UserRole.objects.create(user=user, role='seller', is_approved='approved')
+        self.seller = SellerProfile.objects.create(user=user, company_name='Test Company')
+
+        now = timezone.now()
+        self.expiries = [now + timedelta(hours=h) for h in (1, 2, 5, 20, 30, 50, 75, 150, 400)]
+        for expiry in self.expiries:
+            Product.objects.create(
+                seller=self.seller, name='Milk', price=2.50, quantity=10,
+                manufacturing_date=now - timedelta(days=1),
+                expiry_datetime=expiry, status='approved'
+            )
+
+    def test_daily_buckets_in_local_time(self):
+        with self.assertNumQueries(1):
+            buckets = ReduceWaste.get_expiry_buckets(periods=7)
+        self.assertEqual(len(buckets), 7)
+
+        days = [start.date() for start, _ in buckets]
+        self.assertEqual(days[0], timezone.localdate())
+        expected = {day: 0 for day in days}
+        for expiry in self.expiries:
+            day = timezone.localtime(expiry).date()
+            if day in expected:
+                expected[day] += 1
+        self.assertEqual(dict((start.date(), count) for start, count in buckets), expected)
+        self.assertEqual(ReduceWaste.get_expiry_calendar(7), expected)
+
+    def test_hourly_buckets(self):
+        buckets = ReduceWaste.get_expiry_buckets(periods=24, bucket='hour')
+        self.assertEqual(len(buckets), 24)
+        self.assertEqual(sum(count for _, count in buckets), 4)
+        self.assertEqual(buckets[1][0] - buckets[0][0], timedelta(hours=1))
+
+    def test_no_periods(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(ReduceWaste.get_expiry_buckets(periods=0), [])
+            self.assertEqual(ReduceWaste.get_expiry_buckets(periods=-1, bucket='hour'), [])
+            self.assertEqual(ReduceWaste.get_expiry_calendar(days_ahead=0), {})
+
+class SalesAnalyticsTest(TestCase):
+    def setUp(self):
+        self.buyer = User.objects.create_user(username='buyer1', password='testpass123')
+        now = timezone.now()
+        for days_ago, total in [(0, '10.00'), (0, '5.50'), (2, '20.00'), (10, '7.00'), (40, '100.00')]:
+            purchase = Purchase.objects.create(
+                buyer=self.buyer, product_name='Milk', seller_name='Test Company',
+                price=Decimal(total), quantity=1, total_price=Decimal(total)
+            )
+            Purchase.objects.filter(pk=purchase.pk).update(purchased_at=now - timedelta(days=days_ago))
+        self.purchases = Purchase.objects.filter(seller_name='Test Company')
+
+    def test_totals_in_one_query(self):
+        with self.assertNumQueries(1):
+            totals = SalesAnalytics.get_sales_totals(self.purchases, days=(7, 30))
+        self.assertEqual(totals['sales'], 5)
+        self.assertEqual(totals['revenue'], Decimal('142.50'))
+        self.assertEqual(totals['sales_7d'], 3)
+        self.assertEqual(totals['revenue_7d'], Decimal('35.50'))
+        self.assertEqual(totals['sales_30d'], 4)
+        self.assertEqual(totals['revenue_30d'], Decimal('42.50'))
+
+    def test_empty_totals(self):
+        totals = SalesAnalytics.get_sales_totals(Purchase.objects.none(), days=(7,))
+        self.assertEqual(totals['revenue_7d'], Decimal('0'))
+
+    def test_daily_series(self):
+        with self.assertNumQueries(1):
+            series = SalesAnalytics.get_sales_series(self.purchases, periods=7)
+        self.assertEqual(len(series), 7)
+        self.assertEqual(series[-1]['start'].date(), timezone.localdate())
+        self.assertEqual(sum(day['count'] for day in series), 3)
+        self.assertEqual(sum(day['revenue'] for day in series), Decimal('35.50'))
+
+    def test_no_periods(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(SalesAnalytics.get_sales_series(self.purchases, periods=0), [])
+            self.assertEqual(SalesAnalytics.get_sales_series(self.purchases, periods=-1, period='week'), [])
+
+    def test_monthly_series(self):
+        series = SalesAnalytics.get_sales_series(self.purchases, periods=3, period='month')
+        self.assertEqual([m['start'].day for m in series], [1, 1, 1])
+        self.assertEqual(sum(m['count'] for m in series), 5)
+
+class PurchaseSellerBackfillTest(TestCase):
+    def setUp(self):
+        self.buyer = User.objects.create_user(username='buyer1', password='testpass123')
+        user = User.objects.create_user(username='seller1', password='testpass123')
+        UserRole.objects.create(user=user, role='seller', is_approved='approved')
+        self.seller = SellerProfile.objects.create(user=user, company_name='Test Company')
+        now = timezone.now()
+        self.product = Product.objects.create(
+            seller=self.seller, name='Milk', price=2.50, quantity=10,
+            manufacturing_date=now - timedelta(days=1),
+            expiry_datetime=now + timedelta(hours=24), status='approved'
+        )
+
+    def make_purchase(self, **kwargs):
+        defaults = dict(buyer=self.buyer, product_name='Milk', price=1, quantity=1, total_price=1)
+        defaults.update(kwargs)
+        return Purchase.objects.create(**defaults)
+
+    def test_backfill_by_product_then_company_name(self):
+        migration = importlib.import_module(
+            'freshtrack_project.freshtrack_app.migrations.0016_backfill_purchase_seller'
+        )
+        by_product = self.make_purchase(product=self.product, seller_name='Renamed Company')
+        by_name = self.make_purchase(seller_name='Test Company')
+        unknown = self.make_purchase(seller_name='Gone Company')
+
+        migration.backfill_purchase_seller(apps, None)
+
+        for purchase in (by_product, by_name, unknown):
+            purchase.refresh_from_db()
+        self.assertEqual(by_product.seller, self.seller)
+        self.assertEqual(by_name.seller, self.seller)
+        self.assertIsNone(unknown.seller)
+
+class ProductRatingAggregateTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='seller1', password='testpass123')
+        UserRole.objects.create(user=user, role='seller', is_approved='approved')
+        self.seller = SellerProfile.objects.create(user=user, company_name='Test Company')
+        now = timezone.now()
+        self.product = Product.objects.create(
+            seller=self.seller, name='Milk', price=2.50, quantity=10,
+            manufacturing_date=now - timedelta(days=1),
+            expiry_datetime=now + timedelta(hours=24), status='approved'
+        )
+        self.buyers = [
+            User.objects.create_user(username=f'buyer{i}', password='testpass123') for i in range(3)
+        ]
+
+    def assertRating(self, avg, count):
+        self.product.refresh_from_db()
+        self.assertAlmostEqual(self.product.rating_avg, avg, places=3)
+        self.assertEqual(self.product.rating_count, count)
+
+    def test_add_update_delete_keep_aggregates(self):
+        first = Review.objects.create(product=self.product, buyer=self.buyers[0], rating=5)
+        Review.objects.create(product=self.product, buyer=self.buyers[1], rating=2)
+        self.assertRating(3.5, 2)
+
+        first = Review.objects.get(pk=first.pk)
+        first.rating = 3
+        first.save()
+        self.assertRating(2.5, 2)
+
+        first.delete()
+        self.assertRating(2.0, 1)
+        Review.objects.get().delete()
+        self.assertRating(0.0, 0)
+        self.assertEqual(self.product.get_average_rating(), 0)
+
+    def test_cascade_deletes_keep_aggregates(self):
+        purchase = Purchase.objects.create(
+            buyer=self.buyers[0], product=self.product, product_name='Milk', price=2, quantity=1,
+            total_price=2, payment_status='success', transaction_id='FT1',
+        )
+        Review.objects.create(product=self.product, buyer=self.buyers[0], purchase=purchase, rating=5)
+        Review.objects.create(product=self.product, buyer=self.buyers[1], rating=2)
+        Review.objects.create(product=self.product, buyer=self.buyers[2], rating=3)
+        self.assertRating(10 / 3, 3)
+
+        purchase.delete()
+        self.assertRating(2.5, 2)
+        self.buyers[1].delete()
+        self.assertRating(3.0, 1)
+        self.assertFalse(Product.objects.rating_drift().exists())
+
+    def test_rebuild_ratings_fixes_drift(self):
+        Review.objects.create(product=self.product, buyer=self.buyers[0], rating=4)
+        Review.objects.create(product=self.product, buyer=self.buyers[1], rating=5)
+        Product.objects.filter(pk=self.product.pk).update(rating_avg=1, rating_count=7)
+
+        out = StringIO()
+        call_command('rebuild_ratings', '--dry-run', stdout=out)
+        self.assertIn('Found 1 product(s)', out.getvalue())
+        self.assertRating(1.0, 7)
+
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertRating(4.5, 2)
+        self.assertFalse(Product.objects.rating_drift().exists())
+
+    def test_buyer_dashboard_does_not_query_per_card(self):
+        client = Client()
+        client.login(username='buyer0', password='testpass123')
+        client.get('/buyer/')
+
+        with CaptureQueriesContext(connection) as baseline:
+            client.get('/buyer/')
+        now = timezone.now()
+        for i in range(5):
+            product = Product.objects.create(
+                seller=self.seller, name=f'Bread {i}', price=1, quantity=5,
+                manufacturing_date=now - timedelta(days=1),
+                expiry_datetime=now + timedelta(hours=30), status='approved'
+            )
+            Review.objects.create(product=product, buyer=self.buyers[1], rating=4)
+        # Re-warm the shared widget cache, which the new products invalidated
+        client.get('/buyer/')
+        with CaptureQueriesContext(connection) as more:
+            client.get('/buyer/')
+        self.assertEqual(len(baseline), len(more))
+
+class SellerReviewSummaryTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='seller1', password='testpass123')
+        UserRole.objects.create(user=user, role='seller', is_approved='approved')
+        self.seller = SellerProfile.objects.create(user=user, company_name='Test Company')
+        now = timezone.now()
+        self.product = Product.objects.create(
+            seller=self.seller, name='Milk', price=2.50, quantity=10,
+            manufacturing_date=now - timedelta(days=1),
+            expiry_datetime=now + timedelta(hours=24), status='approved'
+        )
+        for i, rating in enumerate([5, 5, 4, 1]):
+            buyer = User.objects.create_user(username=f'buyer{i}', password='testpass123')
+            Review.objects.create(product=self.product, buyer=buyer, rating=rating)
+
+    def test_summary_in_one_query(self):
+        with self.assertNumQueries(1):
+            summary = self.seller.get_review_summary()
+        self.assertEqual(summary['total'], 4)
+        self.assertEqual(summary['average'], 3.8)
+        self.assertEqual(summary['counts'], {5: 2, 4: 1, 3: 0, 2: 0, 1: 1})
+        self.assertEqual(summary['breakdown'][5], 50.0)
+        self.assertEqual(self.seller.get_rating_breakdown(), summary['breakdown'])
+
+    def test_empty_summary(self):
+        Review.objects.all().delete()
+        summary = self.seller.get_review_summary()
+        self.assertEqual(summary['total'], 0)
+        self.assertEqual(summary['breakdown'], {5: 0, 4: 0, 3: 0, 2: 0, 1: 0})
+
+    def test_cached_summary_follows_review_changes(self):
+        cached = self.seller.get_review_summary(cached=True)
+        self.assertEqual(cached, self.seller.get_review_summary())
+
+        review = Review.objects.get(rating=1)
+        review.rating = 3
+        review.save()
+        Review.objects.get(rating=4).delete()
+
+        seller = SellerProfile.objects.get(pk=self.seller.pk)
+        with self.assertNumQueries(1):
+            cached = seller.get_review_summary(cached=True)
+        self.assertEqual(cached['counts'], {5: 2, 4: 0, 3: 1, 2: 0, 1: 0})
+        self.assertEqual(cached, seller.get_review_summary())
+
+    def test_cached_summary_follows_cascade_deletes(self):
+        now = timezone.now()
+        cheese = Product.objects.create(
+            seller=self.seller, name='Cheese', price=4, quantity=3,
+            manufacturing_date=now - timedelta(days=1),
+            expiry_datetime=now + timedelta(hours=24), status='approved'
+        )
+        Review.objects.create(product=cheese, buyer=User.objects.get(username='buyer0'), rating=2)
+        self.assertEqual(self.seller.get_review_summary(cached=True)['total'], 5)
+
+        # Selling out deletes the product, and its reviews with it
+        decrement_stock(cheese.pk, 3)
+        self.assertEqual(SellerReviewSummary.objects.get(seller=self.seller).total_reviews, 4)
+
+        User.objects.get(username='buyer3').delete()
+        seller = SellerProfile.objects.get(pk=self.seller.pk)
+        self.assertEqual(seller.get_review_summary(cached=True), seller.get_review_summary())
+        self.assertEqual(seller.get_review_summary(cached=True)['counts'][1], 0)
+
+        # Sold out through a cart order: a queryset delete
+        decrement_stock_many({self.product.pk: 10})
+        seller = SellerProfile.objects.get(pk=self.seller.pk)
+        self.assertEqual(seller.get_review_summary(cached=True)['total'], 0)
+
+class MoneySavingDealsTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='seller1', password='testpass123')
+        UserRole.objects.create(user=user, role='seller', is_approved='approved')
+        seller = SellerProfile.objects.create(user=user, company_name='Test Company')
+        now = timezone.now()
+        # (price, discount_percent, discount_percentage) -> savings 5.00, 0, 12.00, 1.50, 30.00
+        for i, (price, manual, auto) in enumerate([
+            (50, 10, 0), (20, 0, 0), (40, 15, 30), (3, 50, 10), (100, 0, 30),
+        ]):
+            Product.objects.create(
+                seller=seller, name=f'Item {i}', price=price, quantity=5,
+                discount_percent=manual, discount_percentage=auto,
+                manufacturing_date=now - timedelta(days=1),
+                expiry_datetime=now + timedelta(hours=20), status='approved'
+            )
+
+    def test_deals_ordered_by_savings_in_sql(self):
+        deals = SaveMoney.get_money_saving_deals()
+        self.assertEqual([deal['savings'] for deal in deals], [30.0, 12.0, 5.0, 1.5])
+        self.assertEqual([deal['discount'] for deal in deals], [30, 30, 10, 50])
+        self.assertEqual(set(deals[0]), {'product', 'discount', 'savings', 'hours'})
+
+    def test_limit_fetches_top_rows_in_one_query(self):
+        with self.assertNumQueries(1):
+            deals = SaveMoney.get_money_saving_deals(limit=2)
+        self.assertEqual([deal['product'].name for deal in deals], ['Item 4', 'Item 2'])
+
+    def test_savings_expression_keeps_cents_for_whole_number_prices(self):
+        Product.objects.all().delete()
+        seller = SellerProfile.objects.get()
+        now = timezone.now()
+        for price, discount in [(10, 15), (3, 50), (7, 5)]:
+            Product.objects.create(
+                seller=seller, name=f'{price} at {discount}', price=Decimal(price), quantity=1,
+                discount_percent=discount, manufacturing_date=now - timedelta(days=1),
+                expiry_datetime=now + timedelta(hours=20), status='approved'
+            )
+        savings = Product.objects.annotate(saved=savings_expression()).order_by('-saved', 'name')
+        self.assertEqual(
+            [Decimal(str(product.saved)).quantize(Decimal('0.01')) for product in savings],
+            [Decimal('1.50'), Decimal('1.50'), Decimal('0.35')],
+        )
+        self.assertEqual([deal['product'].name for deal in SaveMoney.get_money_saving_deals()], ['10 at 15', '3 at 50', '7 at 5'])
+
+class DashboardAggregateStatsTest(TestCase):
+    def setUp(self):
+        self.buyer = User.objects.create_user(username='buyer1', password='testpass123')
+        user = User.objects.create_user(username='seller1', password='testpass123')
+        UserRole.objects.create(user=user, role='seller', is_approved='approved')
+        self.seller = SellerProfile.objects.create(user=user, company_name='Test Company')
+        now = timezone.now()
+        for i, (price, quantity, manual, auto, hours) in enumerate([
+            ('12.50', 4, 10, 0, 3), ('8.00', 10, 0, 25, 20), ('30.00', 2, 0, 0, 5),
+            ('5.00', 7, 40, 10, 100), ('9.99', 3, 20, 0, -2),
+        ]):
+            Product.objects.create(
+                seller=self.seller, name=f'Item {i}', price=Decimal(price), quantity=quantity,
+                discount_percent=manual, discount_percentage=auto,
+                manufacturing_date=now - timedelta(days=1),
+                expiry_datetime=now + timedelta(hours=hours), status='approved'
+            )
+
+    def test_waste_prevention_stats_match_python_totals(self):
+        live = [p for p in Product.objects.all() if p.expiry_datetime > timezone.now()]
+        expected = sum(float(p.get_savings() * p.quantity) for p in live if p.get_final_discount() > 0)
+
+        with self.assertNumQueries(2):
+            stats = ReduceWaste.get_waste_prevention_stats()
+        self.assertEqual(stats['total_discount_value'], round(expected, 2))
+        self.assertEqual(stats['estimated_waste_prevented'], round(expected * 0.7, 2))
+        self.assertEqual(stats['products_at_risk'], 2)
+
+    def test_buyer_dashboard_stats_match_python_totals(self):
+        expected = sum(
+            float(p.get_savings()) for p in Product.objects.approved_available()
+            if p.get_final_discount() > 0
+        )
+        with self.assertNumQueries(2):
+            stats = DashboardStats.get_buyer_dashboard_stats(self.buyer)
+        self.assertAlmostEqual(stats['total_savings'], expected, places=6)
+        self.assertEqual(stats['hot_deals'], 2)
+        self.assertEqual(stats['recent_purchases'], 0)
+
+    def test_totals_are_exact_for_whole_number_prices(self):
+        Product.objects.all().delete()
+        now = timezone.now()
+        for price, quantity, discount in [(10, 2, 15), (3, 1, 50), (7, 3, 5)]:
+            Product.objects.create(
+                seller=self.seller, name=f'{price} at {discount}', price=Decimal(price), quantity=quantity,
+                discount_percent=discount, manufacturing_date=now - timedelta(days=1),
+                expiry_datetime=now + timedelta(hours=20), status='approved'
+            )
+        waste = ReduceWaste.get_waste_prevention_stats()
+        self.assertEqual(Decimal(str(waste['total_discount_value'])), Decimal('5.55'))
+        self.assertEqual(Decimal(str(waste['estimated_waste_prevented'])), Decimal('3.89'))
+        catalog = DashboardStats.get_catalog_stats()
+        self.assertEqual(Decimal(str(catalog['total_savings'])), Decimal('3.35'))
+
+    def test_seller_dashboard_stats_in_one_query(self):
+        with self.assertNumQueries(1):
+            stats = DashboardStats.get_seller_dashboard_stats(SimpleNamespace(seller_profile=self.seller))
+        self.assertEqual(stats, {
+            'total_products': 5,
+            'products_expiring_soon': 3,
+            'products_expired': 1,
+            'total_quantity': 26,
+            'value_at_risk': 12.50 * 4 + 8.00 * 10 + 30.00 * 2 + 9.99 * 3,
+        })
+
+
+@skipUnless(os.environ.get('FRESHTRACK_BENCHMARK'), 'set FRESHTRACK_BENCHMARK=1 to run benchmarks')
+class DashboardStatsBenchmark(TestCase):
+    """Dashboard stats stay a fixed number of queries as the catalog grows to 100k products"""
+
+    def test_stats_cost_is_flat(self):
+        user = User.objects.create_user(username='seller1', password='testpass123')
+        UserRole.objects.create(user=user, role='seller', is_approved='approved')
+        seller = SellerProfile.objects.create(user=user, company_name='Test Company')
+        buyer = User.objects.create_user(username='buyer1', password='testpass123')
+        now = timezone.now()
+
+        created = 0
+        for size in (1000, 10000, 100000):
+            Product.objects.bulk_create([
+                Product(
+                    seller=seller, name=f'Item {i}', price=Decimal('10.00'), quantity=5,
+                    discount_percent=i % 50, seller_active=True,
+                    manufacturing_date=now - timedelta(days=1),
+                    expiry_datetime=now + timedelta(hours=i % 72 + 1), status='approved'
+                )
+                for i in range(created, size)
+            ], batch_size=5000)
+            created = size
+
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                ReduceWaste.get_waste_prevention_stats()
+                DashboardStats.get_buyer_dashboard_stats(buyer)
+                DashboardStats.get_seller_dashboard_stats(SimpleNamespace(seller_profile=seller))
+                elapsed = time.perf_counter() - started
+
+            print(f'\n{size:>7} products: {len(queries)} queries, {elapsed * 1000:.1f} ms')
+            self.assertEqual(len(queries), 5)
+
+class WidgetCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_fresh_value_is_shared(self):
+        self.assertEqual(WidgetCache.get('waste_stats', self.compute), 1)
+        self.assertEqual(WidgetCache.get('waste_stats', self.compute), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_served_while_another_worker_recomputes(self):
+        WidgetCache.get('waste_stats', self.compute)
+        WidgetCache.invalidate()
+
+        # Simulate another worker holding the refresh lock
+        cache.add(WidgetCache.KEY_PREFIX + 'waste_stats:lock', 1)
+        self.assertEqual(WidgetCache.get('waste_stats', self.compute), 1)
+        self.assertEqual(self.calls, 1)
+
+        cache.delete(WidgetCache.KEY_PREFIX + 'waste_stats:lock')
+        self.assertEqual(WidgetCache.get('waste_stats', self.compute), 2)
+        self.assertEqual(WidgetCache.get('waste_stats', self.compute), 2)
+
+    def test_product_changes_invalidate_widgets(self):
+        user = User.objects.create_user(username='seller1', password='testpass123')
+        UserRole.objects.create(user=user, role='seller', is_approved='approved')
+        seller = SellerProfile.objects.create(user=user, company_name='Test Company')
+        now = timezone.now()
+        product = Product.objects.create(
+            seller=seller, name='Milk', price=10, quantity=5,
+            manufacturing_date=now - timedelta(days=1),
+            expiry_datetime=now + timedelta(hours=3), status='approved'
+        )
+        self.assertEqual(CatalogWidgets.money_saving_deals(), [])
+        self.assertEqual(len(CatalogWidgets.hot_deals()), 1)
+        with self.assertNumQueries(0):
+            CatalogWidgets.money_saving_deals()
+            CatalogWidgets.hot_deals()
+
+        product.apply_discount(20)
+        self.assertEqual(CatalogWidgets.money_saving_deals()[0]['discount'], 20)
+
+        seller.hide_all_products()
+        self.assertEqual(CatalogWidgets.hot_deals(), [])
+
+    def test_apis_served_from_cache(self):
+        buyer = User.objects.create_user(username='buyer1', password='testpass123')
+        client = Client()
+        client.login(username='buyer1', password='testpass123')
+        for url in ('/api/money-saving-deals/', '/api/waste-stats/', '/api/hot-deals/'):
+            client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(
+                [q for q in queries if 'freshtrack_app_product' in q['sql']], url
+            )
+
+class CacheStatsCommandTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        WidgetCache.reset_stats()
+
+    def test_counts_hits_stale_and_misses(self):
+        WidgetCache.get('waste_stats', lambda: 1)
+        WidgetCache.get('waste_stats', lambda: 1)
+        WidgetCache.get('hot_deals', lambda: [])
+        self.assertEqual(WidgetCache.stats()['waste_stats'], {'hit': 1, 'stale': 0, 'miss': 1})
+
+        out = StringIO()
+        call_command('cache_stats', '--reset', stdout=out)
+        self.assertRegex(out.getvalue(), r'waste_stats\s+1\s+0\s+1\s+50.0%')
+        self.assertEqual(WidgetCache.stats()['hot_deals'], {'hit': 0, 'stale': 0, 'miss': 0})
+
+    def test_reads_leave_shared_counters_alone_until_flushed(self):
+        WidgetCache.get('waste_stats', lambda: 1)
+        WidgetCache.flush_stats()
+        for _ in range(3):
+            WidgetCache.get('waste_stats', lambda: 1)
+        self.assertIsNone(cache.get(f'{WidgetCache.STATS_PREFIX}waste_stats:hit'))
+        self.assertEqual(WidgetCache.stats()['waste_stats'], {'hit': 3, 'stale': 0, 'miss': 1})
+
+    def test_catalog_alias_can_point_at_file_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            caches_setting = {
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'shared': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                    'LOCATION': location,
+                },
+            }
+            with override_settings(CACHES=caches_setting, CATALOG_CACHE_ALIAS='shared'):
+                WidgetCache.get('waste_stats', lambda: {'products_at_risk': 3})
+                self.assertTrue(os.listdir(location))
+                self.assertEqual(
+                    WidgetCache.get('waste_stats', lambda: None), {'products_at_risk': 3}
+                )
+                self.assertEqual(WidgetCache.stats()['waste_stats']['hit'], 1)
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite connection tuning')
+class SQLiteTuningTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_hook_applies_pragmas(self):
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('busy_timeout'), settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(self.pragma('cache_size'), settings.SQLITE_PRAGMAS['cache_size'])
+
+    def test_file_database_switches_to_wal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, 'wal.sqlite3'))
+            apply_sqlite_pragmas(db.cursor(), settings.SQLITE_PRAGMAS)
+            self.assertEqual(db.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            db.close()
+
+
+@skipUnless(os.environ.get('FRESHTRACK_BENCHMARK'), 'set FRESHTRACK_BENCHMARK=1 to run benchmarks')
+class SQLiteConcurrentWriterBenchmark(TestCase):
+    """Lock errors from concurrent writers with SQLite defaults vs the tuned pragmas"""
+
+    WRITERS = 8
+    WRITES_PER_WRITER = 200
+
+    def run_writers(self, path, pragmas, timeout):
+        setup = sqlite3.connect(path)
+        setup.execute('CREATE TABLE IF NOT EXISTS hits (id INTEGER PRIMARY KEY, writer INT, n INT)')
+        setup.commit()
+        setup.close()
+        errors = []
+
+        def writer(number):
+            db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+            if pragmas:
+                apply_sqlite_pragmas(db.cursor(), pragmas)
+            for n in range(self.WRITES_PER_WRITER):
+                try:
+                    db.execute('BEGIN IMMEDIATE')
+                    db.execute('INSERT INTO hits (writer, n) VALUES (?, ?)', (number, n))
+                    # A read inside the transaction, like a payment callback checking state
+                    db.execute('SELECT COUNT(*) FROM hits WHERE writer = ?', (number,)).fetchone()
+                    db.execute('COMMIT')
+                except sqlite3.OperationalError as e:
+                    errors.append(str(e))
+                    if db.in_transaction:
+                        db.execute('ROLLBACK')
+            db.close()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(self.WRITERS)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(errors), time.perf_counter() - started
+
+    def test_lock_error_rate(self):
+        total = self.WRITERS * self.WRITES_PER_WRITER
+        with tempfile.TemporaryDirectory() as directory:
+            before, before_time = self.run_writers(os.path.join(directory, 'default.sqlite3'), None, 0)
+            after, after_time = self.run_writers(
+                os.path.join(directory, 'tuned.sqlite3'), settings.SQLITE_PRAGMAS, 5
+            )
+        print(f'\ndefaults: {before}/{total} locked ({before / total:.1%}) in {before_time:.2f}s')
+        print(f'tuned:    {after}/{total} locked ({after / total:.1%}) in {after_time:.2f}s')
+        self.assertEqual(after, 0)
+
+@override_settings(DATABASE_REPLICA_ALIAS='replica')
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_use_replica_only_inside_replica_block(self):
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Product), 'replica')
+            self.assertEqual(self.router.db_for_read(User), 'default')
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_decorated_views_read_replica_on_get_only(self):
+        @read_replica
+        def view(request):
+            return self.router.db_for_read(Purchase)
+
+        factory = RequestFactory()
+        self.assertEqual(view(factory.get('/')), 'replica')
+        self.assertEqual(view(factory.post('/')), 'default')
+
+    @override_settings(DATABASE_REPLICA_ALIAS=None)
+    def test_no_replica_configured(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+class PerformanceMiddlewareTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def run_view(self, view, queries):
+        def counted_view(request):
+            for _ in range(queries):
+                User.objects.exists()
+            return view(request)
+
+        def get_response(request):
+            middleware.process_view(request, counted_view, (), {})
+            return counted_view(request)
+
+        counted_view.__name__ = view.__name__
+        counted_view.__dict__.update(view.__dict__)
+        middleware = PerformanceMiddleware(get_response)
+        return middleware(self.factory.get('/'))
+
+    def test_server_timing_header_and_log(self):
+        def view(request):
+            return HttpResponse('ok')
+
+        with self.assertLogs('freshtrack.performance', level='INFO') as logs:
+            response = self.run_view(view, queries=3)
+        self.assertEqual(response['X-Query-Count'], '3')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="3 queries", tpl;dur=[\d.]+, view;dur=[\d.]+$')
+        self.assertIn('"queries": 3', logs.output[0])
+        self.assertIn('"view": "view"', logs.output[0])
+
+    def test_budget_overrun_fails_loudly_when_strict(self):
+        @query_budget(2)
+        def view(request):
+            for _ in range(int(request.GET.get('queries', 0))):
+                User.objects.exists()
+            return HttpResponse('ok')
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = PerformanceMiddleware(get_response)
+        self.assertEqual(middleware(self.factory.get('/', {'queries': 2}))['X-Query-Count'], '2')
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'query 3 is over the budget of 2'):
+            middleware(self.factory.get('/', {'queries': 3}))
+
+        with override_settings(QUERY_BUDGET_STRICT=False):
+            with self.assertLogs('freshtrack.performance', level='WARNING') as logs:
+                response = middleware(self.factory.get('/', {'queries': 3}))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('over its budget of 2', logs.output[-1])
+
+    def test_queries_outside_the_view_are_only_logged(self):
+        @query_budget(2)
+        def view(request):
+            return HttpResponse('ok')
+
+        # run_view queries outside the decorated view, like session and message middleware do
+        with self.assertLogs('freshtrack.performance', level='WARNING') as logs:
+            response = self.run_view(view, queries=3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Query-Count'], '3')
+        self.assertIn('over its budget of 2', logs.output[-1])
+
+    def test_budgeted_views_report_template_time(self):
+        buyer = User.objects.create_user(username='buyer1', password='testpass123')
+        UserRole.objects.create(user=buyer, role='buyer')
+        client = Client()
+        client.login(username='buyer1', password='testpass123')
+        response = client.get('/buyer/')
+        self.assertEqual(response.status_code, 200)
+        template_ms = float(response['Server-Timing'].split('tpl;dur=')[1].split(',')[0])
+        self.assertGreater(template_ms, 0)
+
+class PaymentLoggingTest(TestCase):
+    def make_record(self, msg, **fields):
+        record = logging.LogRecord('freshtrack.payments', logging.INFO, __file__, 1, msg, None, None)
+        record.fields = fields
+        return record
+
+    @override_settings(SSLCOMMERZ_STORE_ID='shop42', SSLCOMMERZ_STORE_PASSWORD='s3cret')
+    def test_credentials_are_redacted(self):
+        record = self.make_record(
+            'payment_initiate url=https://x/?store_passwd=s3cret',
+            transaction_id='FT1', store_id='shop42', result={'store_passwd': 's3cret', 'note': 'id shop42'},
+        )
+        RedactingFilter().filter(record)
+        line = KeyValueFormatter().format(record)
+        self.assertNotIn('s3cret', line)
+        self.assertNotIn('shop42', line)
+        self.assertIn('transaction_id=FT1', line)
+
+    def test_values_stay_one_token_each(self):
+        record = self.make_record(
+            'payment_failed', transaction_id='FT3', error='card declined\nstatus=VALID',
+            note='say "hi"', query='a=b', empty='', amount=Decimal('10.50'), result={'reason': 'no funds'},
+        )
+        line = KeyValueFormatter().format(record)
+        self.assertNotIn('\n', line)
+        self.assertTrue(line.endswith(
+            'transaction_id=FT3 error="card declined\\nstatus=VALID" note="say \\"hi\\"" query="a=b" '
+            'empty="" amount=10.50 result="{\\"reason\\":\\"no funds\\"}"'
+        ), line)
+
+    def test_queue_handler_writes_from_background_thread(self):
+        stream = StringIO()
+        handler = QueueingStreamHandler(stream)
+        handler.handle(self.make_record('payment_success', transaction_id='FT2', status='success'))
+        handler.close()
+        self.assertRegex(stream.getvalue(), r'INFO freshtrack.payments payment_success transaction_id=FT2 status=success')
+
+    def test_payment_success_logs_transaction_and_status(self):
+        buyer = User.objects.create_user(username='buyer1', password='testpass123')
+        purchase = Purchase.objects.create(
+            buyer=buyer, product_name='Milk', price=1, quantity=1, total_price=1,
+            payment_status='initiated', transaction_id='FT3'
+        )
+        with StubGateway() as gateway, override_settings(SSLCOMMERZ_VALIDATION_URL=gateway.validation_url):
+            reset_client()
+            try:
+                with self.assertLogs('freshtrack.payments', level='DEBUG') as logs:
+                    self.client.post('/payment/success/', {'tran_id': 'FT3', 'val_id': 'V1', 'amount': '1'})
+            finally:
+                reset_client()
+
+        purchase.refresh_from_db()
+        self.assertEqual(purchase.payment_status, 'success')
+        events = [record.getMessage() for record in logs.records]
+        self.assertEqual(events[0], 'payment_callback')
+        self.assertIn('payment_success', events)
+        success = logs.records[events.index('payment_success')]
+        self.assertEqual(success.fields['transaction_id'], 'FT3')
+        self.assertEqual(success.fields['status'], 'success')
+
+class SSLCommerzClientTest(TestCase):
+    def setUp(self):
+        self.gateway = StubGateway(fail_validations=0).start()
+        self.addCleanup(self.gateway.stop)
+
+    def make_client(self, **kwargs):
+        client = SSLCommerzClient(
+            api_url=self.gateway.api_url, validation_url=self.gateway.validation_url,
+            store_id='shop', store_password='pw', backoff_factor=0, **kwargs
+        )
+        self.addCleanup(client.close)
+        return client
+
+    def test_calls_reuse_pooled_connection(self):
+        client = self.make_client()
+        self.assertEqual(client.initiate({'tran_id': 'FT1'}).json()['status'], 'SUCCESS')
+        for n in range(10):
+            self.assertEqual(client.validate(f'V{n}').json()['status'], 'VALID')
+        self.assertEqual(self.gateway.requests, 11)
+        self.assertEqual(self.gateway.connections, 1)
+
+    def test_validation_retries_gateway_errors(self):
+        self.gateway.server.fail_validations = 2
+        response = self.make_client(validation_retries=3).validate('V1')
+        self.assertEqual(response.json()['status'], 'VALID')
+        self.assertEqual(self.gateway.requests, 3)
+
+    def test_async_variant(self):
+        client = self.make_client()
+
+        async def run():
+            return await asyncio.gather(*(client.avalidate(f'V{n}') for n in range(5)))
+
+        responses = asyncio.run(run())
+        self.assertEqual([r.json()['val_id'] for r in responses], [f'V{n}' for n in range(5)])
+
+
+@skipUnless(os.environ.get('FRESHTRACK_BENCHMARK'), 'set FRESHTRACK_BENCHMARK=1 to run benchmarks')
+class SSLCommerzThroughputBenchmark(TestCase):
+    """Validation calls per second: a new connection per call vs the pooled client"""
+
+    CALLS = 300
+
+    def test_pooled_client_throughput(self):
+        with StubGateway() as gateway:
+            started = time.perf_counter()
+            for n in range(self.CALLS):
+                requests.get(gateway.validation_url, params={'val_id': n}, timeout=5).json()
+            unpooled = time.perf_counter() - started
+            unpooled_connections = gateway.connections
+
+            client = SSLCommerzClient(api_url=gateway.api_url, validation_url=gateway.validation_url)
+            started = time.perf_counter()
+            for n in range(self.CALLS):
+                client.validate(n).json()
+            pooled = time.perf_counter() - started
+            client.close()
+
+        print(f'\nper-call requests.get: {self.CALLS / unpooled:.0f} calls/s, {unpooled_connections} connections')
+        print(f'pooled client:         {self.CALLS / pooled:.0f} calls/s, {gateway.connections - unpooled_connections} connections')
+        self.assertEqual(gateway.connections - unpooled_connections, 1)
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.buyer = User.objects.create_user(username='buyer1', password='testpass123')
+        seller_user = User.objects.create_user(username='seller1', password='testpass123')
+        seller = SellerProfile.objects.create(user=seller_user, company_name='Test Company')
+        now = timezone.now()
+        self.product = Product.objects.create(
+            seller=seller, name='Fresh Milk', price=2.50, quantity=10, discount_percent=20,
+            manufacturing_date=now - timedelta(days=1), expiry_datetime=now + timedelta(hours=3),
+            status='approved',
+        )
+        self.gateway = StubGateway().start()
+        self.addCleanup(self.gateway.stop)
+        settings_override = override_settings(SSLCOMMERZ_VALIDATION_URL=self.gateway.validation_url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        reset_client()
+        self.addCleanup(reset_client)
+
+    def make_purchase(self, transaction_id, quantity=2, order_ref=None):
+        return Purchase.objects.create(
+            buyer=self.buyer, product=self.product, product_name='Fresh Milk', price=2, quantity=quantity,
+            total_price=2 * quantity, payment_status='initiated', transaction_id=transaction_id,
+            order_ref=order_ref,
+        )
+
+    def test_callbacks_and_api_views_are_coroutines(self):
+        for path in ('/payment/success/', '/payment/ipn/', '/payment/cart-success/',
+                     '/api/hot-deals/', '/api/waste-stats/', f'/api/product/{self.product.id}/hours/'):
+            self.assertTrue(iscoroutinefunction(resolve(path).func), path)
+
+    async def test_api_view_requires_login(self):
+        response = await AsyncClient().get('/api/hot-deals/')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('next=/api/hot-deals/', response.url)
+
+    async def test_queries_in_worker_threads_are_counted(self):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.buyer)
+        response = await client.get('/api/waste-stats/')
+        self.assertEqual(response.status_code, 200)
+        sync_client = Client()
+        await sync_to_async(sync_client.force_login)(self.buyer)
+        await sync_to_async(cache.clear)()
+        sync_response = await sync_to_async(sync_client.get)('/api/waste-stats/')
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertEqual(response['X-Query-Count'], sync_response['X-Query-Count'])
+
+    async def test_api_view_under_asgi(self):
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(self.buyer)
+        response = await client.get('/api/hot-deals/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([deal['id'] for deal in response.json()['deals']], [self.product.id])
+        self.assertIn('X-Query-Count', response)
+
+        response = await client.post('/api/hot-deals/')
+        self.assertEqual(response.status_code, 405)
+
+    async def test_payment_success_validates_without_blocking(self):
+        purchase = await sync_to_async(self.make_purchase)('FT1')
+        response = await AsyncClient().post('/payment/success/', {'tran_id': 'FT1', 'val_id': 'V1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.gateway.requests, 1)
+        await purchase.arefresh_from_db()
+        await self.product.arefresh_from_db()
+        self.assertEqual(purchase.payment_status, 'success')
+        self.assertEqual(self.product.quantity, 8)
+
+    def test_ipn_and_cart_success_update_purchases(self):
+        self.make_purchase('FT2')
+        self.make_purchase('FT3-1', quantity=1, order_ref='FT3')
+        self.make_purchase('FT3-2', quantity=3, order_ref='FT3')
+
+        self.client.post('/payment/ipn/', {'tran_id': 'FT2', 'val_id': 'V2', 'status': 'VALID'})
+        self.client.post('/payment/cart-success/', {'tran_id': 'FT3'})
+
+        self.assertEqual(Purchase.objects.filter(payment_status='success').count(), 3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 4)
+
+
+class StockServiceTest(TestCase):
+    def setUp(self):
+        self.buyer = User.objects.create_user(username='buyer1', password='testpass123')
+        user = User.objects.create_user(username='seller1', password='testpass123')
+        self.seller = SellerProfile.objects.create(user=user, company_name='Test Company')
+        now = timezone.now()
+        self.product = Product.objects.create(
+            seller=self.seller, name='Fresh Milk', price=2.50, quantity=5,
+            manufacturing_date=now - timedelta(days=1), expiry_datetime=now + timedelta(days=2),
+            status='approved',
+        )
+
+    def make_purchase(self, transaction_id, quantity):
+        return Purchase.objects.create(
+            buyer=self.buyer, product=self.product, seller=self.seller, product_name='Fresh Milk',
+            price=2, quantity=quantity, total_price=2 * quantity, payment_status='initiated',
+            transaction_id=transaction_id,
+        )
+
+    def test_bulk_sell_out_invalidates_widgets_at_once(self):
+        cache.clear()
+        WidgetCache.get('hot_deals', lambda: [self.product.pk])
+        self.assertEqual(decrement_stock_many({self.product.pk: 5}), [])
+        self.assertFalse(Product.objects.filter(pk=self.product.pk).exists())
+        self.assertEqual(WidgetCache.get('hot_deals', lambda: []), [])
+
+    def test_seller_bulk_delete_invalidates_widgets(self):
+        cache.clear()
+        UserRole.objects.create(user=self.seller.user, role='seller', is_approved='approved')
+        self.client.force_login(self.seller.user)
+        WidgetCache.get('hot_deals', lambda: [self.product.pk])
+        response = self.client.post('/seller/bulk-delete/', {'product_ids[]': [self.product.pk]})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Product.objects.filter(pk=self.product.pk).exists())
+        self.assertEqual(WidgetCache.get('hot_deals', lambda: []), [])
+
+    def test_purchase_is_applied_once(self):
+        purchase = self.make_purchase('FT1', 2)
+        first = apply_purchase(purchase, gateway_response='{}')
+        second = apply_purchase(Purchase.objects.get(pk=purchase.pk))
+
+        self.assertTrue(first['applied'])
+        self.assertEqual(first['stock_after'], 3)
+        self.assertFalse(second['applied'])
+        self.product.refresh_from_db()
+        self.seller.refresh_from_db()
+        self.assertEqual(self.product.quantity, 3)
+        self.assertEqual(self.seller.total_sales, 2)
+        self.assertEqual(self.seller.total_revenue, 4)
+        purchase.refresh_from_db()
+        self.assertEqual(purchase.payment_status, 'success')
+        self.assertIsNotNone(purchase.stock_applied_at)
+
+    def test_short_stock_is_left_alone(self):
+        purchase = self.make_purchase('FT1', 6)
+        result = apply_purchase(purchase)
+        self.assertTrue(result['applied'])
+        self.assertIsNone(result['stock_after'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 5)
+
+    def test_sold_out_product_is_deleted(self):
+        result = apply_purchase(self.make_purchase('FT1', 5))
+        self.assertTrue(result['deleted'])
+        self.assertFalse(Product.objects.filter(pk=self.product.pk).exists())
+
+    def test_late_failure_callback_keeps_applied_payment(self):
+        self.make_purchase('FT1', 1)
+        self.client.post('/payment/ipn/', {'tran_id': 'FT1', 'status': 'VALID'})
+        self.client.post('/payment/ipn/', {'tran_id': 'FT1', 'status': 'FAILED'})
+        self.client.post('/payment/ipn/', {'tran_id': 'FT1', 'status': 'VALID'})
+        self.assertEqual(Purchase.objects.get(transaction_id='FT1').payment_status, 'success')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 4)
+
+    def test_fail_and_cancel_redirects_after_ipn_keep_success(self):
+        self.make_purchase('FT1', 1)
+        self.client.post('/payment/ipn/', {'tran_id': 'FT1', 'status': 'VALID'})
+        for path in ('/payment/fail/', '/payment/cancel/'):
+            response = self.client.post(path, {'tran_id': 'FT1'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['product_id'], self.product.id)
+        purchase = Purchase.objects.get(transaction_id='FT1')
+        self.assertEqual(purchase.payment_status, 'success')
+
+        self.make_purchase('FT2', 1)
+        self.client.post('/payment/cancel/', {'tran_id': 'FT2'})
+        self.assertEqual(Purchase.objects.get(transaction_id='FT2').payment_status, 'canceled')
+
+
+class ConcurrentPaymentCallbackTest(TransactionTestCase):
+    """Browser redirect and IPN callbacks for the same payments, fired from several threads at once"""
+
+    THREADS = 8
+
+    def setUp(self):
+        self.gateway = StubGateway().start()
+        self.addCleanup(self.gateway.stop)
+        settings_override = override_settings(SSLCOMMERZ_VALIDATION_URL=self.gateway.validation_url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        reset_client()
+        self.addCleanup(reset_client)
+
+        buyer = User.objects.create_user(username='buyer1', password='testpass123')
+        user = User.objects.create_user(username='seller1', password='testpass123')
+        self.seller = SellerProfile.objects.create(user=user, company_name='Test Company')
+        now = timezone.now()
+        self.product = Product.objects.create(
+            seller=self.seller, name='Fresh Milk', price=2.50, quantity=100,
+            manufacturing_date=now - timedelta(days=1), expiry_datetime=now + timedelta(days=2),
+            status='approved',
+        )
+        for n in range(4):
+            Purchase.objects.create(
+                buyer=buyer, product=self.product, seller=self.seller, product_name='Fresh Milk',
+                price=2, quantity=n + 1, total_price=2 * (n + 1), payment_status='initiated',
+                transaction_id=f'FT{n}',
+            )
+        # A cart order of two purchases (5 + 6 units)
+        for n in range(2):
+            Purchase.objects.create(
+                buyer=buyer, product=self.product, seller=self.seller, product_name='Fresh Milk',
+                price=2, quantity=n + 5, total_price=2 * (n + 5), payment_status='initiated',
+                transaction_id=f'FTC-{n}', order_ref='FTC',
+            )
+
+    def test_each_payment_reduces_stock_once(self):
+        # Every payment gets a redirect and an IPN, twice over, all released together
+        callbacks = [
+            (path, {'tran_id': f'FT{n}', 'val_id': f'V{n}', 'status': 'VALID'})
+            for n in range(4) for path in ('/payment/success/', '/payment/ipn/')
+        ] * 2
+        callbacks += [
+            (path, {'tran_id': 'FTC', 'val_id': 'VC', 'status': 'VALID'})
+            for path in ('/payment/cart-success/', '/payment/ipn/')
+        ] * 2
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def fire(chunk):
+            client = Client()
+            try:
+                barrier.wait()
+                for path, data in chunk:
+                    client.post(path, data)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=fire, args=(callbacks[i::self.THREADS],))
+            for i in range(self.THREADS)
+        ]
+        # payment_success turns unexpected errors (e.g. a lock timeout) into an ERROR log line
+        with self.assertNoLogs('freshtrack.payments', level='ERROR'):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.product.refresh_from_db()
+        self.seller.refresh_from_db()
+        self.assertEqual(self.product.quantity, 100 - (1 + 2 + 3 + 4) - (5 + 6))
+        self.assertEqual(self.seller.total_sales, 1 + 2 + 3 + 4 + 5 + 6)
+        self.assertEqual(Purchase.objects.filter(payment_status='success').count(), 6)
+
+
+class CartCheckoutTest(TestCase):
+    ITEMS = 50
+
+    def setUp(self):
+        self.buyer = User.objects.create_user(username='buyer1', password='testpass123')
+        UserRole.objects.create(user=self.buyer, role='buyer')
+        user = User.objects.create_user(username='seller1', password='testpass123')
+        seller = SellerProfile.objects.create(user=user, company_name='Test Company')
+        now = timezone.now()
+        products = Product.objects.bulk_create([
+            Product(
+                seller=seller, name=f'Product {n}', price=Decimal('10.00'), quantity=20, discount_percent=10,
+                manufacturing_date=now - timedelta(days=1), expiry_datetime=now + timedelta(days=3),
+                status='approved',
+            )
+            for n in range(self.ITEMS)
+        ])
+        Cart.objects.bulk_create([Cart(buyer=self.buyer, product=product, quantity=2) for product in products])
+        self.client.force_login(self.buyer)
+
+        self.gateway = StubGateway().start()
+        self.addCleanup(self.gateway.stop)
+        reset_client()
+        self.addCleanup(reset_client)
+
+    def checkout(self, api_url):
+        with override_settings(SSLCOMMERZ_API_URL=api_url):
+            reset_client()
+            return self.client.post('/cart/process-payment/', {'payment_method': 'card'})
+
+    def test_checkout_creates_purchases_in_a_handful_of_queries(self):
+        response = self.checkout(self.gateway.api_url)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/pay/FT', response.url)
+        self.assertLessEqual(int(response['X-Query-Count']), 12)
+        purchases = Purchase.objects.filter(buyer=self.buyer)
+        self.assertEqual(purchases.count(), self.ITEMS)
+        self.assertEqual({(p.price, p.total_price) for p in purchases}, {(Decimal('9.00'), Decimal('18.00'))})
+        self.assertFalse(Cart.objects.filter(buyer=self.buyer).exists())
+
+    def test_checkout_over_budget_is_logged_not_raised(self):
+        view = resolve('/cart/process-payment/').func
+        self.addCleanup(setattr, view, 'query_budget', view.query_budget)
+        view.query_budget = 2
+
+        with self.assertLogs('freshtrack.performance', level='WARNING') as logs:
+            response = self.checkout(self.gateway.api_url)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/pay/FT', response.url)
+        self.assertEqual(Purchase.objects.filter(buyer=self.buyer).count(), self.ITEMS)
+        self.assertIn('process_cart_payment ran', logs.output[-1])
+        self.assertIn('over its budget of 2', logs.output[-1])
+
+    def test_cart_callbacks_update_the_order_as_a_group(self):
+        self.checkout(self.gateway.api_url)
+        order_ref = Purchase.objects.values_list('order_ref', flat=True).first()
+        # A different order whose ref starts with this one must not be touched
+        other = Purchase.objects.create(
+            buyer=self.buyer, product_name='Milk', price=1, quantity=1, total_price=1,
+            payment_status='initiated', transaction_id=f'{order_ref}7-1', order_ref=f'{order_ref}7',
+        )
+
+        response = self.client.post('/payment/cart-success/', {'tran_id': order_ref})
+        self.client.post('/payment/cart-success/', {'tran_id': order_ref})
+        self.client.post('/payment/cart-fail/', {'tran_id': order_ref})
+
+        self.assertEqual(Purchase.objects.filter(order_ref=order_ref, payment_status='success').count(), self.ITEMS)
+        self.assertEqual(set(Product.objects.values_list('quantity', flat=True)), {18})
+        other.refresh_from_db()
+        self.assertEqual(other.payment_status, 'initiated')
+        # Claim, re-read, stock read, one stock UPDATE and seller totals, whatever the cart size
+        self.assertLessEqual(int(response['X-Query-Count']), 12)
+
+    def test_multi_seller_cart_callback_at_the_budget_boundary(self):
+        # Seller totals take one UPDATE per seller and sold-out products are deleted, so
+        # a cart spread over many sellers can go past the budget; the payment must still apply
+        now = timezone.now()
+        Cart.objects.all().delete()
+        sellers = []
+        for n in range(6):
+            user = User.objects.create_user(username=f'seller{n + 2}', password='testpass123')
+            sellers.append(SellerProfile.objects.create(user=user, company_name=f'Company {n}'))
+        for n, seller in enumerate(sellers):
+            for quantity in (2, 5):
+                product = Product.objects.create(
+                    seller=seller, name=f'Item {n}-{quantity}', price=Decimal('10.00'), quantity=quantity,
+                    manufacturing_date=now - timedelta(days=1), expiry_datetime=now + timedelta(days=3),
+                    status='approved',
+                )
+                Cart.objects.create(buyer=self.buyer, product=product, quantity=2)
+        self.checkout(self.gateway.api_url)
+        order_ref = Purchase.objects.values_list('order_ref', flat=True).first()
+
+        with self.assertLogs('freshtrack.performance', level='WARNING') as logs:
+            response = self.client.post('/payment/cart-success/', {'tran_id': order_ref})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-Query-Count']), 12)
+        self.assertIn('payment_cart_success ran', logs.output[-1])
+        self.assertEqual(Purchase.objects.filter(order_ref=order_ref, payment_status='success').count(), 12)
+        # The 2-unit products sold out, the 5-unit ones have 3 left
+        self.assertEqual(
+            sorted(Product.objects.filter(seller__in=sellers).values_list('quantity', flat=True)), [3] * 6
+        )
+        for seller in sellers:
+            seller.refresh_from_db()
+            self.assertEqual((seller.total_sales, seller.total_revenue), (4, Decimal('40.00')))
+
+    def test_order_ref_backfill(self):
+        migration = importlib.import_module('freshtrack_project.freshtrack_app.migrations.0020_purchase_order_ref')
+        Purchase.objects.create(
+            buyer=self.buyer, product_name='Milk', price=1, quantity=1, total_price=1, transaction_id='FTAB12-7',
+        )
+        Purchase.objects.create(
+            buyer=self.buyer, product_name='Milk', price=1, quantity=1, total_price=1, transaction_id='FTCD34',
+        )
+        migration.populate_order_ref(apps, None)
+        self.assertEqual(
+            dict(Purchase.objects.values_list('transaction_id', 'order_ref')),
+            {'FTAB12-7': 'FTAB12', 'FTCD34': None},
+        )
+
+    def test_failed_initiation_removes_purchases_and_keeps_cart(self):
+        response = self.checkout(self.gateway.base_url + '/not-the-api')
+
+        self.assertRedirects(response, '/cart/checkout/', fetch_redirect_response=False)
+        self.assertFalse(Purchase.objects.exists())
+        self.assertEqual(Cart.objects.filter(buyer=self.buyer).count(), self.ITEMS)
+
+
+@skipUnless(os.environ.get('FRESHTRACK_BENCHMARK'), 'set FRESHTRACK_BENCHMARK=1 to run benchmarks')
+class CallbackConcurrencyBenchmark(TransactionTestCase):
+    """Payment callbacks per second with a slow gateway: WSGI worker threads vs one ASGI event loop"""
+
+    CALLBACKS = 60
+    WSGI_THREADS = 4
+    GATEWAY_DELAY = 0.2
+
+    def setUp(self):
+        user = User.objects.create_user(username='seller1', password='testpass123')
+        seller = SellerProfile.objects.create(user=user, company_name='Test Company')
+        buyer = User.objects.create_user(username='buyer1', password='testpass123')
+        now = timezone.now()
+        product = Product.objects.create(
+            seller=seller, name='Fresh Milk', price=2.50, quantity=10000,
+            manufacturing_date=now - timedelta(days=1), expiry_datetime=now + timedelta(days=2),
+            status='approved',
+        )
+        Purchase.objects.bulk_create([
+            Purchase(
+                buyer=buyer, product=product, product_name='Fresh Milk', price=2, quantity=1, total_price=2,
+                payment_status='initiated', transaction_id=f'FT{n}',
+            )
+            for n in range(2 * self.CALLBACKS)
+        ])
+
+    def run_wsgi(self, transaction_ids):
+        def callback(tran_id):
+            Client().post('/payment/success/', {'tran_id': tran_id, 'val_id': tran_id})
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.WSGI_THREADS) as pool:
+            list(pool.map(callback, transaction_ids))
+        return time.perf_counter() - started
+
+    async def run_asgi(self, transaction_ids):
+        client = AsyncClient()
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            client.post('/payment/success/', {'tran_id': tran_id, 'val_id': tran_id})
+            for tran_id in transaction_ids
+        ))
+        return time.perf_counter() - started
+
+    def test_callback_throughput(self):
+        ids = [f'FT{n}' for n in range(2 * self.CALLBACKS)]
+        with StubGateway(delay=self.GATEWAY_DELAY) as gateway, \
+                override_settings(SSLCOMMERZ_VALIDATION_URL=gateway.validation_url):
+            reset_client()
+            try:
+                wsgi = self.run_wsgi(ids[:self.CALLBACKS])
+                asgi = async_to_sync(self.run_asgi)(ids[self.CALLBACKS:])
+            finally:
+                reset_client()
+
+        print(f'\n{self.CALLBACKS} callbacks, gateway answers in {self.GATEWAY_DELAY * 1000:.0f}ms')
+        print(f'WSGI, {self.WSGI_THREADS} worker threads: {self.CALLBACKS / wsgi:.1f} callbacks/s')
+        print(f'ASGI, one event loop:     {self.CALLBACKS / asgi:.1f} callbacks/s')
+        self.assertEqual(Purchase.objects.filter(payment_status='success').count(), 2 * self.CALLBACKS)
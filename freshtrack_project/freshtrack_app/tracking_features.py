@@ -1,16 +1,39 @@
 """
 Fresh Track Features Implementation
 - Hour-Based Tracking
-- Smart Alerts
+- Smart Alerts (+ bulk AlertEngine)
 - Save Money (Discounts)
 - Reduce Waste
+- Sales Analytics
+- Catalog Widgets (shared TTL cache for buyer widgets)
 """
 
 from django.utils import timezone
 from datetime import timedelta
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 from .models import Product, Alert, Purchase
-from django.db.models import Q
+from .widget_cache import WidgetCache
+from django.db.models import (
+    Q, F, Case, When, Value, CharField, DecimalField, FloatField, ExpressionWrapper, Exists, OuterRef, Count, Sum,
+)
+from django.db.models.functions import Cast, Greatest, TruncDay, TruncHour, TruncWeek, TruncMonth
+
+def to_cents(value):
+    """Round a database sum (float on SQLite/PostgreSQL, Decimal elsewhere) half-up to cents"""
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def savings_expression():
+    """
+    Product.get_savings() as a database expression: price * effective discount / 100.
+    SQLite stores whole-number prices (10.00) as INTEGER, where the division would truncate,
+    so the price is cast to float first; round totals to cents in Python.
+    """
+    return ExpressionWrapper(
+        Cast('price', FloatField()) * Greatest('discount_percent', 'discount_percentage') / Value(100),
+        output_field=FloatField(),
+    )
+
 
 class HourBasedTracking:
     """Track exactly how many hours remain before expiry"""
@@ -62,6 +85,24 @@ class HourBasedTracking:
 class SmartAlerts:
     """Generate smart alerts for products nearing expiry"""
     
+    SELLER_MESSAGES = {
+        'last_chance': (
+            "⏰ URGENT: Product '{name}' expires in less than 1 hour! "
+            "Consider a deep discount to sell quickly."
+        ),
+        'urgent': (
+            "⚠️ URGENT: Product '{name}' expires in {hours:.1f} hours. "
+            "Apply a discount to accelerate sales."
+        ),
+        'soon': "📢 REMINDER: Product '{name}' expires in {hours:.1f} hours.",
+        'warning': "📋 INFO: Product '{name}' expires in {hours:.1f} hours.",
+    }
+    
+    BUYER_MESSAGES = {
+        'last_chance': "🔥 LAST CHANCE: '{name}' expires in less than 1 hour! Grab it now!",
+        'urgent': "🎉 HOT DEAL: '{name}' - {hours:.1f} hours left for amazing savings!",
+    }
+    
     @staticmethod
     def create_seller_alert(product, alert_level, message):
         """Create alert for seller about their product"""
@@ -107,42 +148,26 @@ class SmartAlerts:
         """Check product and create appropriate alerts"""
         hours = HourBasedTracking.get_hours_remaining(product)
         
-        # Critical alerts (< 1 hour)
+        # last_chance < 1h, urgent 1-6h, soon 6-24h, warning 24-48h
         if 0 < hours < 1:
-            SmartAlerts.create_seller_alert(
-                product, 'last_chance',
-                f"⏰ URGENT: Product '{product.name}' expires in less than 1 hour! "
-                f"Consider a deep discount to sell quickly."
-            )
-            SmartAlerts.create_buyer_alert(
-                product, 'last_chance',
-                f"🔥 LAST CHANCE: '{product.name}' expires in less than 1 hour! Grab it now!"
-            )
-        
-        # Urgent alerts (1-6 hours)
+            level = 'last_chance'
         elif 1 <= hours < 6:
-            SmartAlerts.create_seller_alert(
-                product, 'urgent',
-                f"⚠️ URGENT: Product '{product.name}' expires in {hours:.1f} hours. "
-                f"Apply a discount to accelerate sales."
-            )
-            SmartAlerts.create_buyer_alert(
-                product, 'urgent',
-                f"🎉 HOT DEAL: '{product.name}' - {hours:.1f} hours left for amazing savings!"
-            )
-        
-        # Soon alerts (6-24 hours)
+            level = 'urgent'
         elif 6 <= hours < 24:
-            SmartAlerts.create_seller_alert(
-                product, 'soon',
-                f"📢 REMINDER: Product '{product.name}' expires in {hours:.1f} hours."
-            )
-        
-        # Warning alerts (24-48 hours)
+            level = 'soon'
         elif 24 <= hours < 48:
-            SmartAlerts.create_seller_alert(
-                product, 'warning',
-                f"📋 INFO: Product '{product.name}' expires in {hours:.1f} hours."
+            level = 'warning'
+        else:
+            return
+        
+        SmartAlerts.create_seller_alert(
+            product, level,
+            SmartAlerts.SELLER_MESSAGES[level].format(name=product.name, hours=hours)
+        )
+        if level in SmartAlerts.BUYER_MESSAGES:
+            SmartAlerts.create_buyer_alert(
+                product, level,
+                SmartAlerts.BUYER_MESSAGES[level].format(name=product.name, hours=hours)
             )
     
     @staticmethod
@@ -172,29 +197,131 @@ class SmartAlerts:
         alert.save()
 
 
+class AlertEngine:
+    """Generate SmartAlerts for the whole catalog in bulk, outside of page views"""
+    
+    # (alert_level, lower bound, upper bound) on time remaining before expiry
+    THRESHOLDS = [
+        ('last_chance', timedelta(hours=0), timedelta(hours=1)),
+        ('urgent', timedelta(hours=1), timedelta(hours=6)),
+        ('soon', timedelta(hours=6), timedelta(hours=24)),
+        ('warning', timedelta(hours=24), timedelta(hours=48)),
+    ]
+    
+    @staticmethod
+    def _level_expression(now):
+        """CASE expression mapping expiry_datetime to the threshold bucket it falls in"""
+        whens = [
+            When(expiry_datetime__gte=now + lower, expiry_datetime__lt=now + upper, then=Value(level))
+            for level, lower, upper in AlertEngine.THRESHOLDS
+        ]
+        return Case(*whens, default=Value('normal'), output_field=CharField())
+    
+    @staticmethod
+    def _alert_exists(alert_type):
+        return Exists(Alert.objects.filter(
+            product=OuterRef('pk'),
+            alert_type=alert_type,
+            alert_level=OuterRef('level'),
+        ))
+    
+    @staticmethod
+    def run(now=None):
+        """
+        Emit missing seller/buyer alerts for approved products within 48 hours of expiry.
+        Returns {'products_scanned': int, 'alerts_emitted': int}.
+        """
+        now = now or timezone.now()
+        horizon = now + AlertEngine.THRESHOLDS[-1][2]
+        
+        in_window = Product.objects.filter(
+            status='approved',
+            expiry_datetime__gt=now,
+            expiry_datetime__lt=horizon,
+        )
+        products_scanned = in_window.count()
+        
+        # Anti-join against existing alerts for the product's current bucket
+        candidates = in_window.annotate(
+            level=AlertEngine._level_expression(now),
+            seller_alerted=AlertEngine._alert_exists('seller'),
+            buyer_alerted=AlertEngine._alert_exists('buyer'),
+        ).filter(
+            Q(seller_alerted=False) |
+            Q(buyer_alerted=False, level__in=list(SmartAlerts.BUYER_MESSAGES))
+        ).values('id', 'name', 'expiry_datetime', 'level', 'seller_alerted', 'buyer_alerted')
+        
+        new_alerts = []
+        for row in candidates:
+            level = row['level']
+            hours = round((row['expiry_datetime'] - now).total_seconds() / 3600, 1)
+            priority = SmartAlerts._get_priority(level)
+            
+            if not row['seller_alerted']:
+                new_alerts.append(Alert(
+                    product_id=row['id'],
+                    alert_type='seller',
+                    alert_level=level,
+                    message=SmartAlerts.SELLER_MESSAGES[level].format(name=row['name'], hours=hours),
+                    priority=priority,
+                ))
+            if not row['buyer_alerted'] and level in SmartAlerts.BUYER_MESSAGES:
+                new_alerts.append(Alert(
+                    product_id=row['id'],
+                    alert_type='buyer',
+                    alert_level=level,
+                    message=SmartAlerts.BUYER_MESSAGES[level].format(name=row['name'], hours=hours),
+                    priority=priority,
+                ))
+        
+        Alert.objects.bulk_create(new_alerts)
+        
+        return {
+            'products_scanned': products_scanned,
+            'alerts_emitted': len(new_alerts),
+        }
+
+
 class SaveMoney:
     """Find and promote discounted items nearing expiry"""
     
     @staticmethod
-    def get_money_saving_deals(queryset=None):
-        """Get products with discounts, sorted by potential savings"""
+    def get_money_saving_deals(queryset=None, limit=None):
+        """
+        Get products with discounts, sorted by potential savings.
+        Savings are computed and ordered in the database; pass limit to fetch only the top rows.
+        """
         if queryset is None:
             queryset = Product.objects.approved_available()
         
-        deals = []
-        for product in queryset:
-            discount = product.get_final_discount()
-            if discount > 0:
-                savings = product.get_savings()
-                deals.append({
-                    'product': product,
-                    'discount': discount,
-                    'savings': float(savings),
-                    'hours': HourBasedTracking.get_hours_remaining(product)
-                })
+        queryset = queryset.annotate(
+            final_discount=Greatest('discount_percent', 'discount_percentage'),
+        ).filter(final_discount__gt=0).annotate(
+            savings_amount=savings_expression(),
+        ).order_by('-savings_amount', 'pk')
+        
+        if limit is not None:
+            queryset = queryset[:limit]
         
-        # Sort by savings amount (highest first)
-        return sorted(deals, key=lambda x: x['savings'], reverse=True)
+        return [
+            {
+                'product': product,
+                'discount': product.final_discount,
+                'savings': float(product.get_savings()),
+                'hours': HourBasedTracking.get_hours_remaining(product)
+            }
+            for product in queryset
+        ]
+    
+    @staticmethod
+    def get_hot_deals(limit=20):
+        """Approved products expiring within 6 hours, soonest first"""
+        now = timezone.now()
+        return list(Product.objects.filter(
+            status='approved',
+            expiry_datetime__lte=now + timedelta(hours=6),
+            expiry_datetime__gt=now
+        ).select_related('seller').order_by('expiry_datetime')[:limit])
     
     @staticmethod
     def recommend_discount_for_product(product):
@@ -294,23 +421,19 @@ class ReduceWaste:
         """Get statistics about waste prevention efforts"""
         now = timezone.now()
         
-        # Products saved by discount
-        discounted_products = Product.objects.filter(
-            Q(discount_percentage__gt=0) | Q(discount_percent__gt=0),
+        # Discount value and products at risk from one aggregate over live approved products
+        discounted = Q(discount_percentage__gt=0) | Q(discount_percent__gt=0)
+        stats = Product.objects.filter(
             status='approved',
             expiry_datetime__gt=now
+        ).aggregate(
+            total_discount_value=Sum(
+                ExpressionWrapper(savings_expression() * F('quantity'), output_field=FloatField()),
+                filter=discounted,
+            ),
+            products_at_risk=Count('id', filter=Q(expiry_datetime__lte=now + timedelta(hours=6))),
         )
-        
-        total_discount_value = sum(
-            float(p.get_savings() * p.quantity) for p in discounted_products
-        )
-        
-        # Products at risk
-        at_risk = Product.objects.filter(
-            status='approved',
-            expiry_datetime__lte=now + timedelta(hours=6),
-            expiry_datetime__gt=now
-        ).count()
+        total_discount_value = to_cents(stats['total_discount_value'])
         
         # Recently purchased (within last 24 hours)
         recent_purchases = Purchase.objects.filter(
@@ -319,50 +442,86 @@ class ReduceWaste:
         ).count()
         
         return {
-            'total_discount_value': round(total_discount_value, 2),
-            'products_at_risk': at_risk,
+            'total_discount_value': float(total_discount_value),
+            'products_at_risk': stats['products_at_risk'],
             'recent_purchases': recent_purchases,
-            'estimated_waste_prevented': round(total_discount_value * 0.7, 2),  # Estimate 70% prevent waste
+            'estimated_waste_prevented': float(to_cents(total_discount_value * Decimal('0.7'))),  # Estimate 70% prevent waste
         }
     
     @staticmethod
-    def get_expiry_calendar(days_ahead=7):
-        """Get calendar of product expiries for the next N days"""
+    def get_expiry_buckets(queryset=None, periods=7, bucket='day'):
+        """
+        Count upcoming expiries per day or per hour with a single GROUP BY query.
+        Buckets follow the configured TIME_ZONE and empty buckets are filled with 0.
+        Returns a list of (bucket_start, count) for the next `periods` days/hours.
+        """
+        if periods < 1:
+            return []
+        if queryset is None:
+            queryset = Product.objects.filter(status='approved')
+        
         now = timezone.now()
-        calendar = {}
+        local_now = timezone.localtime(now)
+        if bucket == 'hour':
+            trunc, step = TruncHour, timedelta(hours=1)
+            first = local_now.replace(minute=0, second=0, microsecond=0)
+        else:
+            trunc, step = TruncDay, timedelta(days=1)
+            first = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
         
-        for day in range(days_ahead):
-            current_day = now + timedelta(days=day)
-            day_start = current_day.replace(hour=0, minute=0, second=0, microsecond=0)
-            day_end = day_start + timedelta(days=1)
-            
-            products = Product.objects.filter(
-                status='approved',
-                expiry_datetime__gte=day_start,
-                expiry_datetime__lt=day_end
-            ).count()
-            
-            calendar[current_day.date()] = products
+        starts = [first + step * i for i in range(periods)]
         
-        return calendar
+        rows = queryset.filter(
+            expiry_datetime__gte=now,
+            expiry_datetime__lt=starts[-1] + step,
+        ).annotate(
+            bucket=trunc('expiry_datetime')
+        ).order_by().values('bucket').annotate(count=Count('id'))
+        
+        counts = {row['bucket']: row['count'] for row in rows}
+        return [(start, counts.get(start, 0)) for start in starts]
+    
+    @staticmethod
+    def get_expiry_calendar(days_ahead=7):
+        """Get calendar of product expiries for the next N days"""
+        return {
+            day_start.date(): count
+            for day_start, count in ReduceWaste.get_expiry_buckets(periods=days_ahead)
+        }
 
 
 class DashboardStats:
     """Get statistics for dashboard display"""
     
     @staticmethod
-    def get_buyer_dashboard_stats(user):
-        """Get stats for buyer dashboard"""
-        return {
-            'hot_deals': Product.objects.filter(
-                status='approved',
-                expiry_datetime__lt=timezone.now() + timedelta(hours=6),
-                expiry_datetime__gt=timezone.now()
-            ).count(),
-            'total_savings': sum(
-                float(p.get_savings()) for p in Product.objects.approved_available()
-                if p.get_final_discount() > 0
+    def get_catalog_stats():
+        """Catalog-wide part of the buyer dashboard stats (hot_deals, total_savings)"""
+        now = timezone.now()
+        
+        # Hot deals count every approved product, savings only those visible to buyers
+        stats = Product.objects.filter(
+            status='approved',
+            expiry_datetime__gt=now
+        ).aggregate(
+            hot_deals=Count('id', filter=Q(expiry_datetime__lt=now + timedelta(hours=6))),
+            total_savings=Sum(
+                savings_expression(),
+                filter=Q(seller_active=True) & (Q(discount_percentage__gt=0) | Q(discount_percent__gt=0)),
             ),
+        )
+        
+        return {
+            'hot_deals': stats['hot_deals'],
+            'total_savings': float(to_cents(stats['total_savings'])),
+        }
+    
+    @staticmethod
+    def get_buyer_dashboard_stats(user, catalog_stats=None):
+        """Get stats for buyer dashboard (pass catalog_stats to reuse a cached copy)"""
+        if catalog_stats is None:
+            catalog_stats = DashboardStats.get_catalog_stats()
+        return {
+            **catalog_stats,
             'recent_purchases': Purchase.objects.filter(
                 buyer=user,
                 payment_status='success'
@@ -377,27 +536,140 @@ class DashboardStats:
             if not seller:
                 return {}
             
-            products = seller.products.all()
-            
-            return {
-                'total_products': products.count(),
-                'products_expiring_soon': products.filter(
-                    expiry_datetime__lte=timezone.now() + timedelta(hours=24),
-                    expiry_datetime__gt=timezone.now()
-                ).count(),
-                'products_expired': products.filter(
-                    expiry_datetime__lte=timezone.now()
-                ).count(),
-                'total_quantity': sum(p.quantity for p in products),
-                'value_at_risk': sum(
-                    float(p.price * p.quantity) for p in products
-                    if p.expiry_datetime <= timezone.now() + timedelta(hours=24)
+            now = timezone.now()
+            expiring = Q(expiry_datetime__lte=now + timedelta(hours=24))
+            stats = seller.products.aggregate(
+                total_products=Count('id'),
+                products_expiring_soon=Count('id', filter=expiring & Q(expiry_datetime__gt=now)),
+                products_expired=Count('id', filter=Q(expiry_datetime__lte=now)),
+                total_quantity=Sum('quantity'),
+                value_at_risk=Sum(
+                    ExpressionWrapper(
+                        F('price') * F('quantity'),
+                        output_field=DecimalField(max_digits=14, decimal_places=2),
+                    ),
+                    filter=expiring,
                 ),
-            }
+            )
+            
+            stats['total_quantity'] = stats['total_quantity'] or 0
+            stats['value_at_risk'] = float(stats['value_at_risk']) if stats['value_at_risk'] is not None else 0
+            return stats
         except:
             return {}
 
 
+class CatalogWidgets:
+    """Catalog-wide buyer widgets, computed once per TTL and shared by every buyer"""
+    
+    # Largest slice any caller asks for; smaller slices are cut from the cached list
+    DEALS_LIMIT = 10
+    HOT_DEALS_LIMIT = 20
+    
+    @staticmethod
+    def money_saving_deals(limit=DEALS_LIMIT):
+        deals = WidgetCache.get(
+            'money_saving_deals',
+            lambda: SaveMoney.get_money_saving_deals(limit=CatalogWidgets.DEALS_LIMIT),
+        )
+        return deals[:limit]
+    
+    @staticmethod
+    def hot_deals(limit=HOT_DEALS_LIMIT):
+        products = WidgetCache.get(
+            'hot_deals',
+            lambda: SaveMoney.get_hot_deals(limit=CatalogWidgets.HOT_DEALS_LIMIT),
+        )
+        return products[:limit]
+    
+    @staticmethod
+    def waste_stats():
+        return WidgetCache.get('waste_stats', ReduceWaste.get_waste_prevention_stats)
+    
+    @staticmethod
+    def buyer_dashboard_stats(user):
+        catalog_stats = WidgetCache.get('catalog_stats', DashboardStats.get_catalog_stats)
+        return DashboardStats.get_buyer_dashboard_stats(user, catalog_stats=catalog_stats)
+
+
+class SalesAnalytics:
+    """Sales counts and revenue computed in the database"""
+    
+    @staticmethod
+    def get_sales_totals(queryset, days=(7, 30)):
+        """
+        Total sales and revenue, plus the same for each trailing window in `days`,
+        from one aggregate query.
+        Returns e.g. {'sales': 12, 'revenue': Decimal('340.00'), 'sales_7d': 3, 'revenue_7d': ...}
+        """
+        now = timezone.now()
+        aggregates = {
+            'sales': Count('id'),
+            'revenue': Sum('total_price'),
+        }
+        for window in days:
+            recent = Q(purchased_at__gte=now - timedelta(days=window))
+            aggregates[f'sales_{window}d'] = Count('id', filter=recent)
+            aggregates[f'revenue_{window}d'] = Sum('total_price', filter=recent)
+        
+        totals = queryset.aggregate(**aggregates)
+        for key, value in totals.items():
+            if key.startswith('revenue') and value is None:
+                totals[key] = Decimal('0')
+        return totals
+    
+    @staticmethod
+    def _period_starts(period, periods):
+        """Start of each of the last `periods` days/weeks/months in local time, oldest first"""
+        today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        if period == 'month':
+            starts = []
+            year, month = today.year, today.month
+            for _ in range(periods):
+                starts.append(today.replace(year=year, month=month, day=1))
+                year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+            return starts[::-1]
+        
+        if period == 'week':
+            current, step = today - timedelta(days=today.weekday()), timedelta(weeks=1)
+        else:
+            current, step = today, timedelta(days=1)
+        return [current - step * i for i in range(periods - 1, -1, -1)]
+    
+    @staticmethod
+    def get_sales_series(queryset, periods=7, period='day'):
+        """
+        Sales count and revenue per day, week or month for the last `periods` periods,
+        grouped in the database with one query. Empty periods are filled with zeros.
+        Returns a list of {'start': datetime, 'count': int, 'revenue': Decimal}, oldest first.
+        """
+        if periods < 1:
+            return []
+        trunc = {'week': TruncWeek, 'month': TruncMonth}.get(period, TruncDay)
+        starts = SalesAnalytics._period_starts(period, periods)
+        
+        rows = queryset.filter(
+            purchased_at__gte=starts[0]
+        ).annotate(
+            bucket=trunc('purchased_at')
+        ).order_by().values('bucket').annotate(
+            count=Count('id'),
+            revenue=Sum('total_price'),
+        )
+        
+        by_bucket = {row['bucket']: row for row in rows}
+        series = []
+        for start in starts:
+            row = by_bucket.get(start, {})
+            series.append({
+                'start': start,
+                'count': row.get('count', 0),
+                'revenue': row.get('revenue') or Decimal('0'),
+            })
+        return series
+
+
 def initialize_tracking_for_product(product):
     """Initialize all tracking features for a new product"""
     HourBasedTracking.get_hours_remaining(product)
@@ -71,4 +71,6 @@ urlpatterns = [
     path('api/alert/<int:alert_id>/read/', api_tracking.api_mark_alert_read, name='api_mark_alert_read'),
     path('api/product/<int:product_id>/apply-discount/', api_tracking.api_apply_recommended_discount, name='api_apply_discount'),
     path('api/hot-deals/', api_tracking.api_hot_deals, name='api_hot_deals'),
+    path('api/admin/products/', api_tracking.api_admin_products, name='api_admin_products'),
+    path('api/expiry-timeline/', api_tracking.api_expiry_timeline, name='api_expiry_timeline'),
 ]
@@ -4,16 +4,29 @@ from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.decorators.http import require_http_methods
-from django.views.decorators.csrf import csrf_exempt
+from .async_views import csrf_exempt, arender
 from .models import Product, SellerProfile, Review, Alert, UserRole, Purchase
 from .forms import ProductForm, ReviewForm, UserRegistrationForm
-from .tracking_features import HourBasedTracking, SmartAlerts, SaveMoney, ReduceWaste, DashboardStats
-from django.db.models import Avg, Count, Q
+from .tracking_features import (
+    HourBasedTracking, SmartAlerts, ReduceWaste, DashboardStats, SalesAnalytics, CatalogWidgets,
+)
+from .pagination import keyset_paginate
+from .db_router import read_replica
+from .instrumentation import query_budget
+from .payment_logging import log_payment, logger as payment_logger
+from .sslcommerz import get_client as get_sslcommerz_client
+from .stock import apply_order, apply_purchase
+from .widget_cache import WidgetCache
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from datetime import timedelta
 from django.conf import settings
 from django.http import HttpResponse
+from urllib.parse import urlencode
+import logging
 import requests
 import json
 import uuid
@@ -36,18 +49,16 @@ def home(request):
 
     # For Admin: Show all products for moderation
     if request.user.is_authenticated and (request.user.is_staff or request.user.is_superuser or (hasattr(request.user, 'role') and request.user.role.role == 'admin')):
-        all_products = Product.objects.select_related('seller', 'seller__user').order_by('-created_at')
-        pending_count = all_products.filter(status='pending').count()
-        approved_count = all_products.filter(status='approved').count()
-        rejected_count = all_products.filter(status='rejected').count()
-        expired_count = all_products.filter(status='expired').count()
+        # First page only, the full table lives on admin_products
+        all_products = keyset_paginate(Product.objects.admin_listing(), page_size=25)
+        counts = Product.objects.status_counts()
         
         context = {
             'all_products': all_products,
-            'pending_count': pending_count,
-            'approved_count': approved_count,
-            'rejected_count': rejected_count,
-            'expired_count': expired_count,
+            'pending_count': counts['pending'],
+            'approved_count': counts['approved'],
+            'rejected_count': counts['rejected'],
+            'expired_count': counts['expired'],
             'role': role,
             'is_admin': True,
         }
@@ -128,6 +139,8 @@ def logout_view(request):
     return redirect('home')
 
 @login_required
+@read_replica
+@query_budget(15)
 def buyer_dashboard(request):
     try:
         role = request.user.role.role
@@ -181,13 +194,13 @@ def buyer_dashboard(request):
         product.hours_status = HourBasedTracking.get_hours_status(product)
     
     # Get money-saving deals
-    money_saving_deals = SaveMoney.get_money_saving_deals(Product.objects.approved_available())[:5]
+    money_saving_deals = CatalogWidgets.money_saving_deals(limit=5)
     
     # Get waste reduction stats
-    waste_stats = ReduceWaste.get_waste_prevention_stats()
+    waste_stats = CatalogWidgets.waste_stats()
     
     # Get buyer dashboard stats
-    buyer_stats = DashboardStats.get_buyer_dashboard_stats(request.user)
+    buyer_stats = CatalogWidgets.buyer_dashboard_stats(request.user)
     
     # Get cart count
     from .models import Cart
@@ -207,14 +220,14 @@ def buyer_dashboard(request):
     return render(request, 'buyer_dashboard.html', context)
 
 @login_required
+@query_budget(10)
 def product_detail(request, product_id):
     # STRICT VISIBILITY: Only show approved + non-expired products from approved sellers
     product = get_object_or_404(
         Product.objects.approved_available(),
         id=product_id
     )
-    reviews = product.reviews.all()
-    avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0
+    reviews = product.reviews.select_related('buyer')
 
     if request.method == 'POST':
         form = ReviewForm(request.POST)
@@ -231,12 +244,13 @@ def product_detail(request, product_id):
     context = {
         'product': product,
         'reviews': reviews,
-        'avg_rating': round(avg_rating, 1),
+        'avg_rating': product.get_average_rating(),
         'form': form,
     }
     return render(request, 'product_detail.html', context)
 
 @login_required
+@query_budget(15)
 def seller_dashboard(request):
     try:
         role = request.user.role.role
@@ -255,15 +269,9 @@ def seller_dashboard(request):
 
     seller_profile = get_object_or_404(SellerProfile, user=request.user)
     
-    # Get all products
+    # Get all products (expired status is maintained by the expire_products sweeper)
     products = seller_profile.products.all()
     
-    # Auto-update expired products
-    for product in products:
-        if product.remaining_seconds() <= 0 and product.status != 'expired':
-            product.status = 'expired'
-            product.save()
-    
     # Apply filters
     status_filter = request.GET.get('status', '')
     expiry_filter = request.GET.get('expiry', '')
@@ -286,35 +294,16 @@ def seller_dashboard(request):
     
     products = products.order_by('-created_at')
     
-    # Calculate dashboard statistics
-    total_products = seller_profile.products.count()
-    approved_count = seller_profile.products.filter(status='approved').count()
-    pending_count = seller_profile.products.filter(status='pending').count()
-    rejected_count = seller_profile.products.filter(status='rejected').count()
-    expired_count = seller_profile.products.filter(status='expired').count()
-    
-    # Expiring in 24 hours
-    expiring_24h_cutoff = timezone.now() + timedelta(hours=24)
-    expiring_24h = seller_profile.products.filter(
-        expiry_datetime__lte=expiring_24h_cutoff,
-        expiry_datetime__gt=timezone.now(),
-        status='approved'
-    ).count()
-    
-    # Get expiry timeline (next 7 days)
-    expiry_timeline = []
-    for day in range(7):
-        day_start = timezone.now() + timedelta(days=day)
-        day_end = day_start + timedelta(days=1)
-        count = seller_profile.products.filter(
-            expiry_datetime__gte=day_start,
-            expiry_datetime__lt=day_end,
-            status='approved'
-        ).count()
-        expiry_timeline.append({
-            'day': day_start.strftime('%a %d'),
-            'count': count
-        })
+    # Calculate dashboard statistics (status buckets + expiring in 24 hours, one query)
+    counts = Product.objects.status_counts(seller=seller_profile)
+    
+    # Get expiry timeline (next 7 days, one grouped query)
+    expiry_timeline = [
+        {'day': day_start.strftime('%a %d'), 'count': count}
+        for day_start, count in ReduceWaste.get_expiry_buckets(
+            seller_profile.products.filter(status='approved'), periods=7
+        )
+    ]
     
     # Get products needing discount
     products_need_discount = seller_profile.products.filter(
@@ -331,42 +320,14 @@ def seller_dashboard(request):
                 'discount': recommended
             })
     
-    # Sales data (last 7 and 30 days)
-    purchases_7d = Purchase.objects.filter(
-        seller_name=seller_profile.company_name,
-        purchased_at__gte=timezone.now() - timedelta(days=7)
-    )
-    sales_7d = purchases_7d.count()
-    revenue_7d = sum(p.total_price for p in purchases_7d)
-    
-    purchases_30d = Purchase.objects.filter(
-        seller_name=seller_profile.company_name,
-        purchased_at__gte=timezone.now() - timedelta(days=30)
-    )
-    sales_30d = purchases_30d.count()
-    revenue_30d = sum(p.total_price for p in purchases_30d)
+    # Sales data (last 7 and 30 days) and daily chart (last 7 days), computed in the database
+    seller_purchases = Purchase.objects.filter(seller=seller_profile)
+    sales_totals = SalesAnalytics.get_sales_totals(seller_purchases, days=(7, 30))
+    daily_series = SalesAnalytics.get_sales_series(seller_purchases, periods=7)
     
-    # Daily sales data for chart (last 7 days)
-    daily_sales_data = []
-    daily_revenue_data = []
-    daily_labels = []
-    
-    for day in range(6, -1, -1):  # 6 days ago to today
-        day_start = (timezone.now() - timedelta(days=day)).replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + timedelta(days=1)
-        
-        day_purchases = Purchase.objects.filter(
-            seller_name=seller_profile.company_name,
-            purchased_at__gte=day_start,
-            purchased_at__lt=day_end
-        )
-        
-        daily_sales = day_purchases.count()
-        daily_revenue = sum(p.total_price for p in day_purchases)
-        
-        daily_sales_data.append(daily_sales)
-        daily_revenue_data.append(float(daily_revenue))
-        daily_labels.append(day_start.strftime('%b %d'))
+    daily_labels = [day['start'].strftime('%b %d') for day in daily_series]
+    daily_sales_data = [day['count'] for day in daily_series]
+    daily_revenue_data = [float(day['revenue']) for day in daily_series]
     
     # Add hour tracking to products
     for product in products:
@@ -386,18 +347,18 @@ def seller_dashboard(request):
     context = {
         'seller': seller_profile,
         'products': products,
-        'total_products': total_products,
-        'approved_count': approved_count,
-        'pending_count': pending_count,
-        'rejected_count': rejected_count,
-        'expired_count': expired_count,
-        'expiring_24h': expiring_24h,
+        'total_products': counts['total'],
+        'approved_count': counts['approved'],
+        'pending_count': counts['pending'],
+        'rejected_count': counts['rejected'],
+        'expired_count': counts['expired'],
+        'expiring_24h': counts['expiring_24h'],
         'expiry_timeline': expiry_timeline,
         'discount_suggestions': discount_suggestions[:10],  # Top 10
-        'sales_7d': sales_7d,
-        'revenue_7d': revenue_7d,
-        'sales_30d': sales_30d,
-        'revenue_30d': revenue_30d,
+        'sales_7d': sales_totals['sales_7d'],
+        'revenue_7d': sales_totals['revenue_7d'],
+        'sales_30d': sales_totals['sales_30d'],
+        'revenue_30d': sales_totals['revenue_30d'],
         'daily_labels': daily_labels,
         'daily_sales_data': daily_sales_data,
         'daily_revenue_data': daily_revenue_data,
@@ -488,6 +449,7 @@ def edit_product(request, product_id):
     return render(request, 'edit_product.html', context)
 
 @login_required
+@query_budget(12)
 def admin_dashboard(request):
     try:
         if not request.user.is_staff and not request.user.is_superuser:
@@ -500,19 +462,8 @@ def admin_dashboard(request):
     except:
         return redirect('home')
 
-    # Get all seller-added products with seller information
-    all_products = Product.objects.select_related('seller', 'seller__user').order_by('-created_at')
-    
-    # Add hour tracking to products
-    for product in all_products:
-        product.hours_remaining = HourBasedTracking.get_hours_remaining(product)
-        product.hours_status = HourBasedTracking.get_hours_status(product)
-    
-    # Statistics
-    pending_count = all_products.filter(status='pending').count()
-    approved_count = all_products.filter(status='approved').count()
-    rejected_count = all_products.filter(status='rejected').count()
-    expired_count = all_products.filter(status='expired').count()
+    # Statistics (the product table itself is paginated on admin_products)
+    counts = Product.objects.status_counts()
     
     # Get all users with roles
     all_users = UserRole.objects.select_related('user').order_by('-user__date_joined')
@@ -520,26 +471,14 @@ def admin_dashboard(request):
     approved_users = all_users.filter(is_approved='approved')
     rejected_users = all_users.filter(is_approved='rejected')
     
-    # Get all sellers with their product counts and role info
-    sellers = SellerProfile.objects.select_related('user').all()
-    for seller in sellers:
-        seller.product_count = seller.products.count()
-        seller.approved_products = seller.products.filter(status='approved').count()
-        seller.pending_products = seller.products.filter(status='pending').count()
-        seller.rejected_products = seller.products.filter(status='rejected').count()
-        # Ensure seller has a role
-        try:
-            seller.user_role = seller.user.role
-        except:
-            # Create role if it doesn't exist
-            seller.user_role = UserRole.objects.create(user=seller.user, role='seller', is_approved='pending')
+    # The dashboard only shows how many sellers there are; the list lives on admin_sellers
+    seller_count = SellerProfile.objects.count()
     
     # Get pending edit requests
     from .models import ProductEditRequest
     pending_edit_requests = ProductEditRequest.objects.filter(status='pending').select_related('product', 'seller', 'seller__user').order_by('-requested_at')
     
     # Get most selling products (by quantity sold)
-    from django.db.models import Sum, Count
     most_selling_products = Purchase.objects.filter(payment_status='success').values('product_name').annotate(
         total_quantity=Sum('quantity'),
         total_sales=Count('id')
@@ -552,16 +491,16 @@ def admin_dashboard(request):
     ).order_by('-total_revenue')[:10]
 
     context = {
-        'all_products': all_products,
-        'pending_count': pending_count,
-        'approved_count': approved_count,
-        'rejected_count': rejected_count,
-        'expired_count': expired_count,
+        'total_products': counts['total'],
+        'pending_count': counts['pending'],
+        'approved_count': counts['approved'],
+        'rejected_count': counts['rejected'],
+        'expired_count': counts['expired'],
         'all_users': all_users,
         'pending_users': pending_users,
         'approved_users': approved_users,
         'rejected_users': rejected_users,
-        'sellers': sellers,
+        'seller_count': seller_count,
         'pending_edit_requests': pending_edit_requests,
         'most_selling_products': most_selling_products,
         'highest_revenue_products': highest_revenue_products,
@@ -570,6 +509,7 @@ def admin_dashboard(request):
     return render(request, 'admin_dashboard.html', context)
 
 @login_required
+@read_replica
 def admin_sales_analytics(request):
     """Sales Analytics Detail Page"""
     try:
@@ -605,6 +545,7 @@ def admin_sales_analytics(request):
     return render(request, 'admin_sales_analytics.html', context)
 
 @login_required
+@query_budget(10)
 def admin_products(request):
     """All Products Detail Page"""
     try:
@@ -618,16 +559,41 @@ def admin_products(request):
     except:
         return redirect('home')
     
-    all_products = Product.objects.all().order_by('-created_at')
-    pending_products = Product.objects.filter(status='pending')
-    approved_products = Product.objects.filter(status='approved')
-    rejected_products = Product.objects.filter(status='rejected')
+    # Server-side filters
+    status_filter = request.GET.get('status', '')
+    seller_filter = request.GET.get('seller', '')
+    expiry_filter = request.GET.get('expiry', '')
+    
+    products = Product.objects.admin_listing(
+        status=status_filter,
+        seller=seller_filter,
+        expiry=expiry_filter,
+    )
+    
+    # Keyset pagination over (created_at, id)
+    products_page = keyset_paginate(products, request.GET.get('cursor'), page_size=25)
+    
+    # Hour tracking only for the rows on this page
+    for product in products_page:
+        product.hours_remaining = HourBasedTracking.get_hours_remaining(product)
+        product.hours_status = HourBasedTracking.get_hours_status(product)
+    
+    filter_query = urlencode({
+        key: value for key, value in [
+            ('status', status_filter),
+            ('seller', seller_filter),
+            ('expiry', expiry_filter),
+        ] if value
+    })
     
     context = {
-        'all_products': all_products,
-        'pending_products': pending_products,
-        'approved_products': approved_products,
-        'rejected_products': rejected_products,
+        'products': products_page,
+        'counts': Product.objects.status_counts(),
+        'sellers': SellerProfile.objects.order_by('company_name').values('id', 'company_name'),
+        'status_filter': status_filter,
+        'seller_filter': seller_filter,
+        'expiry_filter': expiry_filter,
+        'filter_query': filter_query,
         'role': 'admin',
     }
     return render(request, 'admin_products.html', context)
@@ -753,6 +719,7 @@ def pending_product(request, product_id):
     return redirect('admin_dashboard')
 
 @login_required
+@query_budget(10)
 def seller_alerts(request):
     try:
         role = request.user.role.role
@@ -762,16 +729,13 @@ def seller_alerts(request):
         return redirect('home')
 
     seller_profile = get_object_or_404(SellerProfile, user=request.user)
-    seller_products = seller_profile.products.all()
-
-    for product in seller_products:
-        check_and_create_alerts(product)
 
+    # Alerts are generated in bulk by the generate_alerts command, this page only reads them
     # Priority sorting: unread first, then by priority, then by date
     alerts = Alert.objects.filter(
         product__seller=seller_profile,
         alert_type='seller'
-    ).order_by('is_read', 'priority', '-created_at')
+    ).select_related('product').order_by('is_read', 'priority', '-created_at')
     
     unread_count = alerts.filter(is_read=False).count()
 
@@ -789,50 +753,6 @@ def mark_alert_read(request, alert_id):
     alert.save()
     return redirect('seller_alerts')
 
-def check_and_create_alerts(product):
-    if product.status == 'approved':
-        seconds = product.remaining_seconds()
-        
-        if seconds <= 0:
-            product.status = 'expired'
-            product.save()
-            return
-
-        existing_alert = Alert.objects.filter(
-            product=product,
-            alert_type='seller',
-            alert_level=product.alert_level()
-        ).exists()
-
-        if not existing_alert:
-            alert_level = product.alert_level()
-            
-            alert_messages = {
-                'expired': 'Your product has expired',
-                'last_chance': f'CRITICAL: Only {seconds} seconds left!',
-                'urgent': f'URGENT: Less than 6 hours left ({seconds} seconds)',
-                'soon': f'Expiring soon: Less than 24 hours ({seconds} seconds)',
-                'warning': f'Early warning: Less than 48 hours ({seconds} seconds)',
-                'normal': 'All is normal'
-            }
-            
-            priority_map = {
-                'expired': 1,
-                'last_chance': 1,
-                'urgent': 2,
-                'soon': 3,
-                'warning': 4,
-                'normal': 4
-            }
-
-            Alert.objects.create(
-                product=product,
-                alert_type='seller',
-                alert_level=alert_level,
-                message=alert_messages.get(alert_level, 'Status update'),
-                priority=priority_map.get(alert_level, 4)
-            )
-
 @login_required
 def approve_user(request, user_id):
     try:
@@ -889,8 +809,7 @@ def reject_user(request, user_id):
     if user_role.role == 'seller':
         try:
             seller_profile = SellerProfile.objects.get(user=user)
-            product_count = seller_profile.products.count()
-            seller_profile.hide_all_products()
+            product_count = seller_profile.hide_all_products()
             messages.error(request, f'❌ {user.username} (Seller) has been REJECTED. All {product_count} products are now hidden.')
         except SellerProfile.DoesNotExist:
             messages.error(request, f'❌ {user.username} ({user_role.role}) has been REJECTED')
@@ -924,11 +843,7 @@ def hold_user(request, user_id):
     if user_role.role == 'seller':
         try:
             seller_profile = SellerProfile.objects.get(user=user)
-            products = seller_profile.products.all()
-            product_count = products.count()
-            for product in products:
-                product.status = 'pending'
-                product.save()
+            product_count = seller_profile.hold_all_products()
             messages.warning(request, f'⏸️ {user.username} (Seller) has been PUT ON HOLD. All {product_count} products moved to pending review. (Previous status: {previous_status})')
         except SellerProfile.DoesNotExist:
             messages.warning(request, f'⏸️ {user.username} ({user_role.role}) has been PUT ON HOLD (Previous status: {previous_status})')
@@ -1020,6 +935,7 @@ def buy_product(request, product_id):
         total_price = product.price * quantity
         Purchase.objects.create(
             buyer=request.user,
+            seller=product.seller,
             product_name=product.name,
             seller_name=product.seller.company_name,
             price=product.price,
@@ -1106,6 +1022,9 @@ def bulk_delete_products(request):
             id__in=product_ids,
             seller=seller_profile
         ).delete()[0]
+        if deleted_count:
+            # A queryset delete skips Product.delete(), which is what invalidates the widgets
+            WidgetCache.invalidate()
         
         messages.success(request, f'{deleted_count} product(s) deleted successfully')
     
@@ -1208,6 +1127,7 @@ def quick_edit_product(request, product_id):
     return redirect('seller_dashboard')
 
 @login_required
+@read_replica
 def seller_analytics(request):
     """Seller analytics and insights page"""
     try:
@@ -1219,51 +1139,35 @@ def seller_analytics(request):
     
     seller_profile = get_object_or_404(SellerProfile, user=request.user)
     
-    # Sales data
-    purchases_all = Purchase.objects.filter(seller_name=seller_profile.company_name)
-    total_sales = purchases_all.count()
-    total_revenue = sum(p.total_price for p in purchases_all)
-    
-    # Last 7 days
-    purchases_7d = purchases_all.filter(
-        purchased_at__gte=timezone.now() - timedelta(days=7)
-    )
-    sales_7d = purchases_7d.count()
-    revenue_7d = sum(p.total_price for p in purchases_7d)
-    
-    # Last 30 days
-    purchases_30d = purchases_all.filter(
-        purchased_at__gte=timezone.now() - timedelta(days=30)
-    )
-    sales_30d = purchases_30d.count()
-    revenue_30d = sum(p.total_price for p in purchases_30d)
+    # Sales data (all time, last 7 days, last 30 days in one query)
+    purchases_all = Purchase.objects.filter(seller=seller_profile)
+    sales_totals = SalesAnalytics.get_sales_totals(purchases_all, days=(7, 30))
     
     # Most sold products
-    from collections import Counter
-    product_sales = Counter(p.product_name for p in purchases_all)
-    most_sold = [{'name': name, 'count': count} for name, count in product_sales.most_common(10)]
+    top_products = purchases_all.values('product_name').annotate(
+        count=Count('id')
+    ).order_by('-count', 'product_name')[:10]
+    most_sold = [{'name': row['product_name'], 'count': row['count']} for row in top_products]
     
     # Reviews analysis
     reviews = Review.objects.filter(product__seller=seller_profile)
-    total_reviews = reviews.count()
-    avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] or 0
-    rating_breakdown = seller_profile.get_rating_breakdown()
+    review_summary = seller_profile.get_review_summary(cached=True)
     
     # Top reviews
     top_reviews = reviews.order_by('-rating', '-created_at')[:5]
     
     context = {
         'seller': seller_profile,
-        'total_sales': total_sales,
-        'total_revenue': total_revenue,
-        'sales_7d': sales_7d,
-        'revenue_7d': revenue_7d,
-        'sales_30d': sales_30d,
-        'revenue_30d': revenue_30d,
+        'total_sales': sales_totals['sales'],
+        'total_revenue': sales_totals['revenue'],
+        'sales_7d': sales_totals['sales_7d'],
+        'revenue_7d': sales_totals['revenue_7d'],
+        'sales_30d': sales_totals['sales_30d'],
+        'revenue_30d': sales_totals['revenue_30d'],
         'most_sold': most_sold,
-        'total_reviews': total_reviews,
-        'avg_rating': round(avg_rating, 1),
-        'rating_breakdown': rating_breakdown,
+        'total_reviews': review_summary['total'],
+        'avg_rating': review_summary['average'],
+        'rating_breakdown': review_summary['breakdown'],
         'top_reviews': top_reviews,
         'role': 'seller',
     }
@@ -1406,6 +1310,7 @@ def initiate_payment(request, product_id):
     purchase = Purchase.objects.create(
         buyer=request.user,
         product=product,
+        seller=product.seller,
         product_name=product.name,
         seller_name=product.seller.company_name,
         price=unit_price,  # Store discounted price
@@ -1419,10 +1324,8 @@ def initiate_payment(request, product_id):
     # Build absolute URLs for callbacks
     base_url = request.build_absolute_uri('/')[:-1]
     
-    # Prepare SSLCommerz payment data
+    # Prepare SSLCommerz payment data (the client adds the store credentials)
     payment_data = {
-        'store_id': settings.SSLCOMMERZ_STORE_ID,
-        'store_passwd': settings.SSLCOMMERZ_STORE_PASSWORD,
         'total_amount': str(total_price),
         'currency': 'BDT',
         'tran_id': transaction_id,
@@ -1454,24 +1357,27 @@ def initiate_payment(request, product_id):
     
     try:
         # Log payment initiation
-        print(f"\n{'='*60}")
-        print(f"Initiating payment for transaction: {transaction_id}")
-        print(f"Amount: ৳{total_price} | Method: {payment_method}")
-        print(f"SSLCommerz Store ID: {settings.SSLCOMMERZ_STORE_ID}")
-        print(f"API URL: {settings.SSLCOMMERZ_API_URL}")
-        print(f"Sandbox Mode: {settings.SSLCOMMERZ_IS_SANDBOX}")
-        print(f"{'='*60}\n")
-        
-        # Call SSLCommerz API
-        response = requests.post(
-            settings.SSLCOMMERZ_API_URL, 
-            data=payment_data,
-            timeout=30
+        log_payment(
+            'payment_initiate',
+            transaction_id=transaction_id,
+            amount=str(total_price),
+            method=payment_method,
+            store_id=settings.SSLCOMMERZ_STORE_ID,
+            api_url=settings.SSLCOMMERZ_API_URL,
+            sandbox=settings.SSLCOMMERZ_IS_SANDBOX,
         )
         
+        # Call SSLCommerz API over the shared pooled session
+        response = get_sslcommerz_client().initiate(payment_data)
+        
         # Log raw response
-        print(f"SSLCommerz Response Status Code: {response.status_code}")
-        print(f"SSLCommerz Response Text: {response.text[:500]}")
+        log_payment(
+            'payment_gateway_response',
+            logging.DEBUG,
+            transaction_id=transaction_id,
+            http_status=response.status_code,
+            body=response.text[:500],
+        )
         
         response_data = response.json()
         
@@ -1479,21 +1385,31 @@ def initiate_payment(request, product_id):
         purchase.gateway_response = json.dumps(response_data)
         purchase.save()
         
-        # Log parsed response
-        print(f"Parsed Response Status: {response_data.get('status')}")
-        print(f"Gateway URL: {response_data.get('GatewayPageURL', 'N/A')}")
-        
         if response_data.get('status') == 'SUCCESS':
             gateway_url = response_data.get('GatewayPageURL')
             if gateway_url:
-                print(f"✓ Payment initiation successful! Redirecting to: {gateway_url}")
+                log_payment(
+                    'payment_initiated',
+                    transaction_id=transaction_id,
+                    status=response_data.get('status'),
+                    gateway_url=gateway_url,
+                )
                 # Redirect to SSLCommerz payment page
                 return redirect(gateway_url)
             else:
-                print("✗ Gateway URL not found in response")
+                log_payment(
+                    'payment_initiate_failed', logging.WARNING,
+                    transaction_id=transaction_id,
+                    status=response_data.get('status'),
+                    reason='Gateway URL not found in response',
+                )
         else:
-            print(f"✗ Payment initiation failed. Status: {response_data.get('status')}")
-            print(f"Failed Reason: {response_data.get('failedreason', 'Unknown')}")
+            log_payment(
+                'payment_initiate_failed', logging.WARNING,
+                transaction_id=transaction_id,
+                status=response_data.get('status'),
+                reason=response_data.get('failedreason', 'Unknown'),
+            )
         
         # If failed to get gateway URL
         purchase.payment_status = 'failed'
@@ -1507,35 +1423,35 @@ def initiate_payment(request, product_id):
         purchase.payment_status = 'failed'
         purchase.gateway_response = 'Request timeout'
         purchase.save()
-        print("✗ SSLCommerz API request timeout")
+        log_payment('payment_initiate_error', logging.ERROR, transaction_id=transaction_id, error='Request timeout')
         messages.error(request, 'Payment gateway timeout. Please try again.')
         return redirect('checkout', product_id)
     except requests.exceptions.RequestException as e:
         purchase.payment_status = 'failed'
         purchase.gateway_response = f'Request error: {str(e)}'
         purchase.save()
-        print(f"✗ SSLCommerz API request error: {str(e)}")
+        log_payment('payment_initiate_error', logging.ERROR, transaction_id=transaction_id, error=f'Request error: {e}')
         messages.error(request, 'Unable to connect to payment gateway. Please try again.')
         return redirect('checkout', product_id)
     except json.JSONDecodeError as e:
         purchase.payment_status = 'failed'
         purchase.gateway_response = f'JSON decode error: {str(e)}'
         purchase.save()
-        print(f"✗ Failed to parse SSLCommerz response: {str(e)}")
+        log_payment('payment_initiate_error', logging.ERROR, transaction_id=transaction_id, error=f'JSON decode error: {e}')
         messages.error(request, 'Invalid response from payment gateway. Please try again.')
         return redirect('checkout', product_id)
     except Exception as e:
         purchase.payment_status = 'failed'
         purchase.gateway_response = f'Unexpected error: {str(e)}'
         purchase.save()
-        print(f"✗ Unexpected error during payment initiation: {str(e)}")
+        payment_logger.exception('payment_initiate_error', extra={'fields': {'transaction_id': transaction_id}})
         messages.error(request, f'Payment initialization error. Please contact support.')
         return redirect('checkout', product_id)
 
 
 @csrf_exempt
-def payment_success(request):
-    """Handle successful payment callback"""
+async def payment_success(request):
+    """Handle successful payment callback (async: the gateway validation does not hold a worker)"""
     if request.method in ['POST', 'GET']:
         # Get transaction ID from callback
         tran_id = request.POST.get('tran_id') or request.GET.get('tran_id')
@@ -1544,124 +1460,116 @@ def payment_success(request):
         card_type = request.POST.get('card_type') or request.GET.get('card_type')
         
         # Log callback data
-        print(f"\n{'='*60}")
-        print(f"Payment Success Callback Received")
-        print(f"Transaction ID: {tran_id}")
-        print(f"Validation ID: {val_id}")
-        print(f"Amount: {amount}")
-        print(f"Card Type: {card_type}")
-        print(f"Method: {request.method}")
-        print(f"{'='*60}\n")
+        log_payment(
+            'payment_callback',
+            transaction_id=tran_id,
+            val_id=val_id,
+            amount=amount,
+            card_type=card_type,
+            method=request.method,
+        )
         
         if not tran_id:
-            print("✗ Transaction ID missing from callback")
+            log_payment('payment_callback_invalid', logging.WARNING, reason='Transaction ID missing')
             messages.error(request, 'Invalid payment response - missing transaction ID')
             return redirect('buyer_dashboard')
         
         if not val_id:
-            print("✗ Validation ID missing from callback")
+            log_payment('payment_callback_invalid', logging.WARNING, transaction_id=tran_id, reason='Validation ID missing')
             messages.error(request, 'Invalid payment response - missing validation ID')
             return redirect('buyer_dashboard')
         
         try:
-            purchase = Purchase.objects.get(transaction_id=tran_id)
-            print(f"✓ Purchase found: {purchase.id} | Buyer: {purchase.buyer.username}")
+            purchase = await Purchase.objects.aget(transaction_id=tran_id)
             
             # CRITICAL: Always verify payment with SSLCommerz - never trust redirect alone
-            validation_data = {
-                'val_id': val_id,
-                'store_id': settings.SSLCOMMERZ_STORE_ID,
-                'store_passwd': settings.SSLCOMMERZ_STORE_PASSWORD,
-            }
-            
-            print(f"Verifying payment with SSLCommerz...")
-            print(f"Validation URL: {settings.SSLCOMMERZ_VALIDATION_URL}")
-            
-            validation_response = requests.get(
-                settings.SSLCOMMERZ_VALIDATION_URL,
-                params=validation_data,
-                timeout=30
+            log_payment(
+                'payment_validate',
+                logging.DEBUG,
+                transaction_id=tran_id,
+                purchase_id=purchase.id,
+                buyer_id=purchase.buyer_id,
+                validation_url=settings.SSLCOMMERZ_VALIDATION_URL,
             )
             
-            print(f"Validation Response Status: {validation_response.status_code}")
+            validation_response = await get_sslcommerz_client().avalidate(val_id)
+            
             validation_result = validation_response.json()
-            print(f"Validation Result: {json.dumps(validation_result, indent=2)}")
             
             # Check if payment is valid
             validation_status = validation_result.get('status', '').upper()
+            log_payment(
+                'payment_validation_result',
+                logging.DEBUG,
+                transaction_id=tran_id,
+                http_status=validation_response.status_code,
+                status=validation_status,
+                result=validation_result,
+            )
             
             if validation_status in ['VALID', 'VALIDATED']:
-                # Payment verified successfully
-                print(f"✓ Payment verified successfully!")
+                # Payment verified: mark it paid and reduce stock, unless the IPN (or an
+                # earlier redirect) already did
+                result = await sync_to_async(apply_purchase)(purchase, gateway_response=json.dumps(validation_result))
+                if not result['applied']:
+                    log_payment('payment_duplicate_callback', transaction_id=tran_id, status=purchase.payment_status)
+                    await purchase.arefresh_from_db()
+                    return await arender(request, 'payment_success.html', {'purchase': purchase})
                 
-                # Double-check if already processed to avoid duplicate processing
-                if purchase.payment_status == 'success':
-                    print(f"⚠ Payment already processed for transaction {tran_id}")
-                    return render(request, 'payment_success.html', {'purchase': purchase})
+                log_payment('payment_success', transaction_id=tran_id, status='success', purchase_id=purchase.id)
                 
-                purchase.payment_status = 'success'
-                purchase.payment_completed_at = timezone.now()
-                purchase.gateway_response = json.dumps(validation_result)
-                purchase.save()
-                
-                print(f"Updated purchase status to: success")
-                
-                # Reduce product quantity
-                if purchase.product:
-                    product = purchase.product
-                    print(f"Reducing stock: {product.name} | Current: {product.quantity} | Ordered: {purchase.quantity}")
-                    
-                    product.quantity -= purchase.quantity
-                    
-                    if product.quantity <= 0:
-                        print(f"Product out of stock - deleting product {product.id}")
-                        product.delete()
-                    else:
-                        product.save()
-                        print(f"New stock level: {product.quantity}")
-                    
-                    # Update seller stats
-                    try:
-                        seller = product.seller
-                        seller.total_sales += purchase.quantity
-                        seller.total_revenue += purchase.total_price
-                        seller.save()
-                        print(f"✓ Updated seller stats: {seller.company_name}")
-                    except Exception as e:
-                        print(f"⚠ Failed to update seller stats: {str(e)}")
+                if result['product_id'] is None:
+                    log_payment('payment_product_missing', logging.WARNING, transaction_id=tran_id, purchase_id=purchase.id)
+                elif result['stock_after'] is None:
+                    log_payment(
+                        'payment_stock_short', logging.WARNING,
+                        transaction_id=tran_id,
+                        product_id=result['product_id'],
+                        ordered=purchase.quantity,
+                    )
                 else:
-                    print(f"⚠ Product not found for purchase {purchase.id}")
+                    log_payment(
+                        'payment_stock_reduced',
+                        transaction_id=tran_id,
+                        product_id=result['product_id'],
+                        ordered=purchase.quantity,
+                        stock_after=result['stock_after'],
+                        deleted=result['deleted'],
+                    )
                 
                 messages.success(request, '✓ Payment successful! Your order has been confirmed.')
-                return render(request, 'payment_success.html', {'purchase': purchase})
+                return await arender(request, 'payment_success.html', {'purchase': purchase})
             else:
                 # Validation failed
-                print(f"✗ Payment verification failed. Status: {validation_status}")
-                print(f"Validation result: {validation_result}")
+                log_payment(
+                    'payment_validation_failed', logging.WARNING,
+                    transaction_id=tran_id,
+                    status=validation_status,
+                    result=validation_result,
+                )
                 
-                purchase.payment_status = 'failed'
-                purchase.gateway_response = json.dumps(validation_result)
-                purchase.save()
+                # Never overwrite a payment that another callback already applied
+                await Purchase.objects.filter(pk=purchase.pk, stock_applied_at__isnull=True).aupdate(
+                    payment_status='failed', gateway_response=json.dumps(validation_result),
+                )
                 
                 messages.error(request, 'Payment verification failed. Your payment was not processed.')
                 return redirect('payment_fail')
                 
         except Purchase.DoesNotExist:
-            print(f"✗ Purchase not found for transaction ID: {tran_id}")
+            log_payment('payment_purchase_missing', logging.WARNING, transaction_id=tran_id)
             messages.error(request, 'Order not found in our system')
             return redirect('buyer_dashboard')
         except requests.exceptions.RequestException as e:
-            print(f"✗ Failed to verify payment with SSLCommerz: {str(e)}")
+            log_payment('payment_validate_error', logging.ERROR, transaction_id=tran_id, error=str(e))
             messages.error(request, 'Unable to verify payment. Please contact support with your transaction ID.')
             return redirect('buyer_dashboard')
         except Exception as e:
-            print(f"✗ Unexpected error during payment verification: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            payment_logger.exception('payment_validate_error', extra={'fields': {'transaction_id': tran_id}})
             messages.error(request, f'Payment verification error. Please contact support.')
             return redirect('payment_fail')
     
-    print("✗ Invalid request method or missing data")
+    log_payment('payment_callback_invalid', logging.WARNING, method=request.method, reason='Invalid request method')
     return redirect('buyer_dashboard')
 
 
@@ -1850,14 +1758,12 @@ def payment_fail(request):
     
     product_id = None
     if tran_id:
-        try:
-            purchase = Purchase.objects.get(transaction_id=tran_id)
-            purchase.payment_status = 'failed'
-            purchase.gateway_response = json.dumps(dict(request.POST) if request.POST else dict(request.GET))
-            purchase.save()
-            product_id = purchase.product.id if purchase.product else None
-        except Purchase.DoesNotExist:
-            pass
+        # A payment already applied (e.g. by an earlier IPN) keeps its success status
+        Purchase.objects.filter(transaction_id=tran_id, stock_applied_at__isnull=True).update(
+            payment_status='failed',
+            gateway_response=json.dumps(dict(request.POST) if request.POST else dict(request.GET)),
+        )
+        product_id = Purchase.objects.filter(transaction_id=tran_id).values_list('product_id', flat=True).first()
     
     context = {
         'error_message': error_message,
@@ -1873,14 +1779,12 @@ def payment_cancel(request):
     
     product_id = None
     if tran_id:
-        try:
-            purchase = Purchase.objects.get(transaction_id=tran_id)
-            purchase.payment_status = 'canceled'
-            purchase.gateway_response = json.dumps(dict(request.POST) if request.POST else dict(request.GET))
-            purchase.save()
-            product_id = purchase.product.id if purchase.product else None
-        except Purchase.DoesNotExist:
-            pass
+        # A payment already applied (e.g. by an earlier IPN) keeps its success status
+        Purchase.objects.filter(transaction_id=tran_id, stock_applied_at__isnull=True).update(
+            payment_status='canceled',
+            gateway_response=json.dumps(dict(request.POST) if request.POST else dict(request.GET)),
+        )
+        product_id = Purchase.objects.filter(transaction_id=tran_id).values_list('product_id', flat=True).first()
     
     context = {
         'product_id': product_id,
@@ -1889,7 +1793,7 @@ def payment_cancel(request):
 
 
 @csrf_exempt
-def payment_ipn(request):
+async def payment_ipn(request):
     """Handle IPN (Instant Payment Notification) from SSLCommerz"""
     if request.method == 'POST':
         tran_id = request.POST.get('tran_id')
@@ -1898,33 +1802,23 @@ def payment_ipn(request):
         
         if tran_id:
             try:
-                purchase = Purchase.objects.get(transaction_id=tran_id)
+                purchase = await Purchase.objects.aget(transaction_id=tran_id)
                 
-                # Update payment status based on IPN
+                # Update payment status based on IPN (applied once, even if the redirect races it)
                 if status == 'VALID' or status == 'VALIDATED':
-                    if purchase.payment_status != 'success':
-                        purchase.payment_status = 'success'
-                        purchase.payment_completed_at = timezone.now()
-                        purchase.gateway_response = json.dumps(dict(request.POST))
-                        purchase.save()
-                        
-                        # Reduce product quantity if not already done
-                        if purchase.product and purchase.product.quantity >= purchase.quantity:
-                            product = purchase.product
-                            product.quantity -= purchase.quantity
-                            if product.quantity <= 0:
-                                product.delete()
-                            else:
-                                product.save()
+                    await sync_to_async(apply_purchase)(purchase, gateway_response=json.dumps(dict(request.POST)))
                 elif status in ['FAILED', 'CANCELLED']:
-                    purchase.payment_status = 'failed' if status == 'FAILED' else 'canceled'
-                    purchase.gateway_response = json.dumps(dict(request.POST))
-                    purchase.save()
+                    await Purchase.objects.filter(pk=purchase.pk, stock_applied_at__isnull=True).aupdate(
+                        payment_status='failed' if status == 'FAILED' else 'canceled',
+                        gateway_response=json.dumps(dict(request.POST)),
+                    )
                 
             except Purchase.DoesNotExist:
-                pass
+                # Cart checkouts send the order's tran_id, shared by all its purchases
+                if status == 'VALID' or status == 'VALIDATED':
+                    await sync_to_async(apply_order)(tran_id, gateway_response=json.dumps(dict(request.POST)))
     
-    return render(request, 'payment_ipn.html')
+    return await arender(request, 'payment_ipn.html')
 
 @login_required
 def add_review(request, purchase_id):
@@ -2145,6 +2039,7 @@ def checkout_cart(request):
     return render(request, 'checkout_cart.html', context)
 
 @login_required
+@query_budget(12, strict=False)
 def process_cart_payment(request):
     """Process payment for all cart items"""
     if request.method != 'POST':
@@ -2158,9 +2053,9 @@ def process_cart_payment(request):
         return redirect('home')
     
     from .models import Cart
-    cart_items = Cart.objects.filter(buyer=request.user).select_related('product', 'product__seller')
+    cart_items = list(Cart.objects.filter(buyer=request.user).select_related('product', 'product__seller'))
     
-    if not cart_items.exists():
+    if not cart_items:
         messages.error(request, 'Your cart is empty')
         return redirect('view_cart')
     
@@ -2172,33 +2067,37 @@ def process_cart_payment(request):
         messages.error(request, 'Please select a valid payment method.')
         return redirect('checkout_cart')
     
-    # Calculate total
-    total_amount = sum(item.get_total_price() for item in cart_items)
-    
     # Generate unique transaction ID
     transaction_id = f"FT{uuid.uuid4().hex[:12].upper()}"
     
-    # Create purchase records for each item
+    # Build one purchase per item, pricing each item once
     purchases = []
     for item in cart_items:
-        purchase = Purchase.objects.create(
+        product = item.product
+        price = product.get_discounted_price()
+        purchases.append(Purchase(
             buyer=request.user,
-            product=item.product,
-            product_name=item.product.name,
-            seller_name=item.product.seller.company_name,
-            price=item.product.get_discounted_price(),
+            product=product,
+            seller=product.seller,
+            product_name=product.name,
+            seller_name=product.seller.company_name,
+            price=price,
             quantity=item.quantity,
-            total_price=item.get_total_price(),
+            total_price=price * item.quantity,
             payment_status='initiated',
             payment_method=payment_method,
-            transaction_id=f"{transaction_id}-{item.id}"
-        )
-        purchases.append(purchase)
+            transaction_id=f"{transaction_id}-{item.id}",
+            order_ref=transaction_id,
+        ))
+    total_amount = sum(purchase.total_price for purchase in purchases)
+    
+    # All purchase rows or none; the gateway call stays outside so no write lock is held over it
+    with transaction.atomic():
+        Purchase.objects.bulk_create(purchases)
+    created = Purchase.objects.filter(order_ref=transaction_id)
     
-    # Prepare SSLCommerz payment
+    # Prepare SSLCommerz payment (the client adds the store credentials)
     payment_data = {
-        'store_id': settings.SSLCOMMERZ_STORE_ID,
-        'store_passwd': settings.SSLCOMMERZ_STORE_PASSWORD,
         'total_amount': str(total_amount),
         'currency': 'BDT',
         'tran_id': transaction_id,
@@ -2219,56 +2118,41 @@ def process_cart_payment(request):
     }
     
     try:
-        response = requests.post(settings.SSLCOMMERZ_API_URL, data=payment_data)
+        response = get_sslcommerz_client().initiate(payment_data)
         response_data = response.json()
         
         if response_data.get('status') == 'SUCCESS':
             # Clear cart after successful initiation
-            cart_items.delete()
+            Cart.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
             return redirect(response_data['GatewayPageURL'])
         else:
             # Delete purchases if payment initiation failed
-            for purchase in purchases:
-                purchase.delete()
+            created.delete()
             messages.error(request, 'Payment initiation failed. Please try again.')
             return redirect('checkout_cart')
     except Exception as e:
         # Delete purchases on error
-        for purchase in purchases:
-            purchase.delete()
+        created.delete()
         messages.error(request, f'Payment error: {str(e)}')
         return redirect('checkout_cart')
 
 @csrf_exempt
-def payment_cart_success(request):
+@query_budget(12, strict=False)
+async def payment_cart_success(request):
     """Handle successful cart payment"""
     tran_id = request.POST.get('tran_id') or request.GET.get('tran_id')
     
     purchases_list = []
     if tran_id:
-        # Update all purchases with this transaction base ID
-        purchases = Purchase.objects.filter(transaction_id__startswith=tran_id)
-        
-        for purchase in purchases:
-            if purchase.payment_status != 'success':
-                purchase.payment_status = 'success'
-                purchase.payment_completed_at = timezone.now()
-                purchase.save()
-                
-                # Reduce product quantity
-                if purchase.product and purchase.product.quantity >= purchase.quantity:
-                    product = purchase.product
-                    product.quantity -= purchase.quantity
-                    if product.quantity <= 0:
-                        product.delete()
-                    else:
-                        product.save()
-            
-            purchases_list.append(purchase)
+        # Mark the whole order paid and reduce stock once; repeated callbacks are no-ops
+        result = await sync_to_async(apply_order)(tran_id)
+        if result['short']:
+            log_payment('payment_stock_short', logging.WARNING, order_ref=tran_id, product_ids=result['short'])
+        purchases_list = [purchase async for purchase in Purchase.objects.filter(order_ref=tran_id).select_related('product')]
         
         messages.success(request, 'Payment successful! Thank you for your purchase.')
     
-    return render(request, 'payment_success.html', {
+    return await arender(request, 'payment_success.html', {
         'role': 'buyer',
         'purchases': purchases_list,
         'is_cart_payment': True
@@ -2280,7 +2164,7 @@ def payment_cart_fail(request):
     tran_id = request.POST.get('tran_id') or request.GET.get('tran_id')
     
     if tran_id:
-        purchases = Purchase.objects.filter(transaction_id__startswith=tran_id)
+        purchases = Purchase.objects.filter(order_ref=tran_id, stock_applied_at__isnull=True)
         purchases.update(payment_status='failed')
     
     messages.error(request, 'Payment failed. Please try again.')
@@ -2292,7 +2176,7 @@ def payment_cart_cancel(request):
     tran_id = request.POST.get('tran_id') or request.GET.get('tran_id')
     
     if tran_id:
-        purchases = Purchase.objects.filter(transaction_id__startswith=tran_id)
+        purchases = Purchase.objects.filter(order_ref=tran_id, stock_applied_at__isnull=True)
         purchases.update(payment_status='canceled')
     
     messages.warning(request, 'Payment was canceled.')
@@ -0,0 +1,140 @@
+"""
+Shared TTL cache for catalog-wide widgets (deals, waste stats, hot deals)
+- Values are the same for every buyer, so they are computed once per TTL and shared
+- Product changes call invalidate(), which bumps a version number instead of deleting
+  entries, so readers keep serving the old value while one worker recomputes
+- Stampede protection: a stale entry is refreshed by whichever caller wins cache.add()
+  on the widget's lock key; everyone else returns the stale value meanwhile
+- Uses the CACHES alias named by settings.CATALOG_CACHE_ALIAS and counts hits/misses
+  per widget for `manage.py cache_stats`
+- Counts are kept in process memory and added to the shared counters at most once per
+  STATS_FLUSH_INTERVAL, so serving a widget costs no cache writes (with the database cache
+  every write is an INSERT/UPDATE); counts not yet flushed when a worker exits are lost
+"""
+
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+
+
+def catalog_cache():
+    """The cache backend configured for catalog widgets"""
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+class WidgetCache:
+    """Stale-while-revalidate cache on top of Django's cache framework"""
+
+    # Seconds a widget value is considered fresh
+    TTLS = {
+        'money_saving_deals': 60,
+        'waste_stats': 120,
+        'catalog_stats': 60,
+        'hot_deals': 60,
+    }
+    DEFAULT_TTL = 60
+    # How long a stale value may still be served while it is being recomputed
+    STALE_GRACE = 300
+    # Upper bound on a recompute; the lock expires on its own if a worker dies
+    LOCK_TIMEOUT = 30
+
+    KEY_PREFIX = 'freshtrack:widget:'
+    VERSION_KEY = 'freshtrack:widget:version'
+    STATS_PREFIX = 'freshtrack:stats:'
+    # hit: fresh value, stale: old value served during a refresh, miss: value recomputed
+    OUTCOMES = ('hit', 'stale', 'miss')
+    # Seconds between adding this process's counts to the shared counters
+    STATS_FLUSH_INTERVAL = 60
+
+    _pending = Counter()
+    _pending_lock = threading.Lock()
+    _last_flush = time.monotonic()
+
+    @classmethod
+    def get(cls, name, compute):
+        """Return the cached value for widget `name`, calling compute() when it is missing or stale"""
+        cache = catalog_cache()
+        key = cls.KEY_PREFIX + name
+        lock_key = key + ':lock'
+        cached = cache.get_many([key, cls.VERSION_KEY])
+        version = cached.get(cls.VERSION_KEY, 0)
+        entry = cached.get(key)
+
+        # Nothing to serve yet means compute regardless, so the lock is only taken (and
+        # released) when there is a stale value for other callers to fall back on
+        locked = False
+        if entry is not None:
+            value, fresh_until, entry_version = entry
+            if entry_version == version and time.time() < fresh_until:
+                cls._record(name, 'hit')
+                return value
+            if not cache.add(lock_key, 1, cls.LOCK_TIMEOUT):
+                # Another worker is already recomputing this widget
+                cls._record(name, 'stale')
+                return value
+            locked = True
+
+        cls._record(name, 'miss')
+        try:
+            value = compute()
+            ttl = cls.TTLS.get(name, cls.DEFAULT_TTL)
+            cache.set(key, (value, time.time() + ttl, version), ttl + cls.STALE_GRACE)
+        finally:
+            if locked:
+                cache.delete(lock_key)
+        return value
+
+    @classmethod
+    def invalidate(cls):
+        """Mark every widget stale (called when products change)"""
+        cache = catalog_cache()
+        try:
+            cache.incr(cls.VERSION_KEY)
+        except ValueError:
+            cache.set(cls.VERSION_KEY, 1, None)
+
+    @classmethod
+    def _record(cls, name, outcome):
+        with cls._pending_lock:
+            cls._pending[f'{cls.STATS_PREFIX}{name}:{outcome}'] += 1
+            due = time.monotonic() - cls._last_flush >= cls.STATS_FLUSH_INTERVAL
+        if due:
+            cls.flush_stats()
+
+    @classmethod
+    def flush_stats(cls):
+        """Add the counts recorded by this process to the shared counters"""
+        with cls._pending_lock:
+            pending = dict(cls._pending)
+            cls._pending.clear()
+            cls._last_flush = time.monotonic()
+        cache = catalog_cache()
+        for key, count in pending.items():
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                cache.set(key, count, None)
+
+    @classmethod
+    def stats(cls):
+        """{widget: {'hit': n, 'stale': n, 'miss': n}} for every known widget"""
+        cls.flush_stats()
+        keys = {
+            f'{cls.STATS_PREFIX}{name}:{outcome}': (name, outcome)
+            for name in cls.TTLS for outcome in cls.OUTCOMES
+        }
+        counts = catalog_cache().get_many(list(keys))
+        stats = {name: dict.fromkeys(cls.OUTCOMES, 0) for name in cls.TTLS}
+        for key, (name, outcome) in keys.items():
+            stats[name][outcome] = counts.get(key, 0)
+        return stats
+
+    @classmethod
+    def reset_stats(cls):
+        with cls._pending_lock:
+            cls._pending.clear()
+        catalog_cache().delete_many([
+            f'{cls.STATS_PREFIX}{name}:{outcome}' for name in cls.TTLS for outcome in cls.OUTCOMES
+        ])
@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -7,6 +8,9 @@ SECRET_KEY = 'django-insecure-freshtrack-secret-key-2025'
 
 DEBUG = True
 
+# True while running manage.py test
+TESTING = sys.argv[1:2] == ['test']
+
 ALLOWED_HOSTS = ['*']
 
 # CSRF Settings
@@ -27,6 +31,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost so it times the whole request (Server-Timing header + query budgets)
+    'freshtrack_project.freshtrack_app.instrumentation.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -40,7 +46,8 @@ ROOT_URLCONF = 'freshtrack_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that also reports render time to PerformanceMiddleware
+        'BACKEND': 'freshtrack_project.freshtrack_app.instrumentation.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'freshtrack_project/freshtrack_app/templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -55,14 +62,133 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'freshtrack_project.wsgi.application'
+# Async payment callbacks and API views only run without a thread per request under ASGI
+# (e.g. uvicorn freshtrack_project.asgi:application)
+ASGI_APPLICATION = 'freshtrack_project.asgi.application'
+
+# Database, chosen with DB_ENGINE: sqlite (default) or postgresql
+# - sqlite: DB_NAME is the file path (default: BASE_DIR/db.sqlite3)
+# - postgresql: DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT (needs psycopg2 or psycopg)
+# Connections are kept open for CONN_MAX_AGE seconds and health-checked before reuse
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite').lower()
+CONN_MAX_AGE = int(os.environ.get('CONN_MAX_AGE', '60'))
+
+if DB_ENGINE in ('postgres', 'postgresql'):
+    _primary_db = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('DB_NAME', 'freshtrack'),
+        'USER': os.environ.get('DB_USER', 'freshtrack'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', '5')),
+        },
+    }
+else:
+    _primary_db = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
+        'OPTIONS': {
+            # Seconds the sqlite3 driver waits on a locked database before raising
+            'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')) / 1000,
+        },
+        # Tests use a file rather than a shared in-memory database: threaded tests then get
+        # the same WAL/busy_timeout locking as production (shared-cache memory databases
+        # fail with "table is locked" instead of waiting)
+        'TEST': {'NAME': os.environ.get('DB_TEST_NAME', os.path.join(BASE_DIR, 'test_db.sqlite3'))},
+    }
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        **_primary_db,
+        # Keep connections open between requests (seconds, 0 closes after every request)
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Optional read replica for dashboards, analytics and API GETs (see freshtrack_app/db_router.py)
+# - postgresql: DB_REPLICA_HOST (plus DB_REPLICA_PORT/USER/PASSWORD, defaulting to the primary's)
+# - sqlite test mode: DB_REPLICA_NAME is a second SQLite file, e.g. a copy of db.sqlite3
+DB_REPLICA_HOST = os.environ.get('DB_REPLICA_HOST', '')
+DB_REPLICA_NAME = os.environ.get('DB_REPLICA_NAME', '')
+
+if DB_REPLICA_HOST or DB_REPLICA_NAME:
+    _replica_db = dict(DATABASES['default'])
+    if DB_REPLICA_HOST:
+        _replica_db.update({
+            'HOST': DB_REPLICA_HOST,
+            'PORT': os.environ.get('DB_REPLICA_PORT', _replica_db.get('PORT', '')),
+            'USER': os.environ.get('DB_REPLICA_USER', _replica_db.get('USER', '')),
+            'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', _replica_db.get('PASSWORD', '')),
+        })
+    if DB_REPLICA_NAME:
+        _replica_db['NAME'] = DB_REPLICA_NAME
+    # Tests use a single database; the replica mirrors it
+    _replica_db['TEST'] = {'MIRROR': 'default'}
+    DATABASES['replica'] = _replica_db
+    DATABASE_REPLICA_ALIAS = 'replica'
+
+DATABASE_ROUTERS = ['freshtrack_project.freshtrack_app.db_router.ReplicaRouter']
+
+# Pragmas applied to every new SQLite connection (see freshtrack_app/db_tuning.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024))),
+    # Negative values are KiB, so -20000 is roughly 20 MB of page cache
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', '-20000')),
+}
+
+# Cache backend, chosen with CACHE_BACKEND: locmem (default), file, db or redis
+# - file: CACHE_LOCATION is a directory (default: BASE_DIR/cache)
+# - db: CACHE_LOCATION is a table name (default: freshtrack_cache), create it with createcachetable
+# - redis: CACHE_LOCATION is a redis:// URL; needs the redis package, otherwise falls back to file
+# locmem is per process, so use file, db or redis when running several workers
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem').lower()
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION', '')
+CACHE_TIMEOUT = int(os.environ.get('CACHE_TIMEOUT', '300'))
+
+if CACHE_BACKEND == 'redis':
+    try:
+        import redis  # noqa: F401
+    except ImportError:
+        CACHE_BACKEND = 'file'
+        CACHE_LOCATION = ''
+
+if CACHE_BACKEND == 'redis':
+    _default_cache = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_LOCATION or 'redis://127.0.0.1:6379/1',
+    }
+elif CACHE_BACKEND == 'file':
+    _default_cache = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_LOCATION or os.path.join(BASE_DIR, 'cache'),
+    }
+elif CACHE_BACKEND == 'db':
+    _default_cache = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': CACHE_LOCATION or 'freshtrack_cache',
+    }
+else:
+    _default_cache = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': CACHE_LOCATION or 'freshtrack',
+    }
+
+CACHES = {
+    'default': {**_default_cache, 'TIMEOUT': CACHE_TIMEOUT},
+}
+
+# Which CACHES alias each feature uses
+CATALOG_CACHE_ALIAS = os.environ.get('CATALOG_CACHE_ALIAS', 'default')
+SESSION_CACHE_ALIAS = os.environ.get('SESSION_CACHE_ALIAS', 'default')
+# Sessions stay in the database unless e.g. django.contrib.sessions.backends.cached_db is set
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -81,6 +207,43 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Views decorated with @query_budget(n) raise QueryBudgetExceeded when over budget
+# in tests (DEBUG is on for every deployment of this settings file, so it is not used);
+# otherwise the overrun is only logged
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', str(TESTING)).lower() == 'true'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'redact_credentials': {
+            '()': 'freshtrack_project.freshtrack_app.payment_logging.RedactingFilter',
+        },
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        # Enqueue only; a background thread writes key=value lines to stderr
+        'payments_queue': {
+            'class': 'freshtrack_project.freshtrack_app.payment_logging.QueueingStreamHandler',
+            'filters': ['redact_credentials'],
+        },
+    },
+    'loggers': {
+        # Payment flow: initiation, gateway responses, validation and stock updates
+        'freshtrack.payments': {
+            'handlers': ['payments_queue'],
+            'level': os.environ.get('PAYMENT_LOG_LEVEL', 'WARNING' if TESTING else 'INFO'),
+            'propagate': False,
+        },
+        # One JSON line per request: view, queries, db_ms, template_ms, view_ms
+        'freshtrack.performance': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERFORMANCE_LOG_LEVEL', 'WARNING' if TESTING else 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 
@@ -90,13 +253,19 @@ SSLCOMMERZ_STORE_ID = os.environ.get('SSLCOMMERZ_STORE_ID', 'testbox')
 SSLCOMMERZ_STORE_PASSWORD = os.environ.get('SSLCOMMERZ_STORE_PASSWORD', 'qwerty')
 SSLCOMMERZ_IS_SANDBOX = os.environ.get('SSLCOMMERZ_IS_SANDBOX', 'True').lower() == 'true'
 
-# SSLCommerz URLs
+# SSLCommerz URLs (SSLCOMMERZ_BASE_URL can point at a local stub gateway)
 if SSLCOMMERZ_IS_SANDBOX:
-    SSLCOMMERZ_API_URL = 'https://sandbox.sslcommerz.com/gwprocess/v4/api.php'
-    SSLCOMMERZ_VALIDATION_URL = 'https://sandbox.sslcommerz.com/validator/api/validationserverAPI.php'
+    SSLCOMMERZ_BASE_URL = os.environ.get('SSLCOMMERZ_BASE_URL', 'https://sandbox.sslcommerz.com')
 else:
-    SSLCOMMERZ_API_URL = 'https://securepay.sslcommerz.com/gwprocess/v4/api.php'
-    SSLCOMMERZ_VALIDATION_URL = 'https://securepay.sslcommerz.com/validator/api/validationserverAPI.php'
+    SSLCOMMERZ_BASE_URL = os.environ.get('SSLCOMMERZ_BASE_URL', 'https://securepay.sslcommerz.com')
+SSLCOMMERZ_API_URL = f'{SSLCOMMERZ_BASE_URL}/gwprocess/v4/api.php'
+SSLCOMMERZ_VALIDATION_URL = f'{SSLCOMMERZ_BASE_URL}/validator/api/validationserverAPI.php'
+
+# Gateway client (freshtrack_app/sslcommerz.py): pooled session, timeouts and retries
+SSLCOMMERZ_CONNECT_TIMEOUT = float(os.environ.get('SSLCOMMERZ_CONNECT_TIMEOUT', '5'))
+SSLCOMMERZ_READ_TIMEOUT = float(os.environ.get('SSLCOMMERZ_READ_TIMEOUT', '20'))
+SSLCOMMERZ_VALIDATION_RETRIES = int(os.environ.get('SSLCOMMERZ_VALIDATION_RETRIES', '3'))
+SSLCOMMERZ_POOL_SIZE = int(os.environ.get('SSLCOMMERZ_POOL_SIZE', '20'))
 
 # Payment callback URLs (will be constructed with request.build_absolute_uri)
 PAYMENT_SUCCESS_URL = '/payment/success/'